@@ -0,0 +1,89 @@
+""" Annotation index of owl2dot --annot
+
+The annotations of a graph are read once, in one pass over each annotation property
+(the declared owl:AnnotationProperty and the built-in ones of OWL: rdfs:label,
+rdfs:comment...), then the annotations of a node are a dict lookup. Only the nodes that
+are shown are looked up, and what is shown of them is bounded:
+
+    the properties can be restricted (include) or excluded (exclude)
+
+    the values are filtered by language: the values without language tag and those in the
+    first preferred language that has some (see labels.choose_values)
+
+    at most max_values values per property, and at most max_chars characters for all the
+    annotations of a node: the last value shown is truncated (…) and the number of values
+    that are not shown is added, e.g. "(+5 more)"
+"""
+
+from rdflib import Graph
+from rdflib.namespace import RDF, RDFS, OWL
+from rdflib.term import Node
+
+from labels import choose_values, LABEL_PROPERTIES
+from profiling import profiler
+
+BUILTIN_ANNOTATION_PROPERTIES = [RDFS.label, RDFS.comment, RDFS.seeAlso, RDFS.isDefinedBy,
+                                 OWL.versionInfo, OWL.deprecated, OWL.priorVersion,
+                                 OWL.backwardCompatibleWith, OWL.incompatibleWith]
+
+
+def annotation_properties(graph: Graph) -> list:
+    """ the annotation properties of graph: the label properties first (they are shown
+    first, within the character budget), then the others in the order of their IRIs
+    """
+    properties = set(BUILTIN_ANNOTATION_PROPERTIES)
+    properties.update(graph.subjects(RDF.type, OWL.AnnotationProperty))
+    return sorted(properties, key=lambda p: (p not in LABEL_PROPERTIES, p))
+
+
+def text(value: Node) -> str:
+    """ the value on one line, without the backslashes that dot would read as escapes """
+    return ' '.join(str(value).split()).replace('\\', '')
+
+
+class AnnotationIndex:
+
+    def __init__(self, graph: Graph):
+        self.properties = annotation_properties(graph)
+        self.values = {}        # resource -> annotation property -> values, in the order of the properties
+        for p in self.properties:
+            for s, o in graph.subject_objects(p):
+                self.values.setdefault(s, {}).setdefault(p, []).append(o)
+
+    def update(self, graph: Graph, resources):
+        """ read again the annotations of resources, after their triples changed in graph """
+        for r in resources:
+            self.values.pop(r, None)
+            for p in self.properties:
+                for o in graph.objects(r, p):
+                    self.values.setdefault(r, {}).setdefault(p, []).append(o)
+
+    def annotations(self, resource: Node, languages: list, include: set = None, exclude: set = (),
+                    max_values: int = 0, max_chars: int = 0) -> list:
+        """ the (property, texts) of the annotations of resource shown with these bounds
+        (0: no bound, include None: all the properties)
+        """
+        result = []
+        remaining = max_chars
+        for p, values in self.values.get(resource, {}).items():
+            if (include is not None and p not in include) or p in exclude:
+                continue
+            if max_chars and remaining <= 0:
+                break
+            values = choose_values(values, languages)
+            texts = []
+            for value in values[:max_values or None]:
+                t = text(value)
+                if max_chars:
+                    if len(t) > remaining:
+                        t = t[:remaining].rstrip() + '…'
+                        profiler.count('annotation_truncated')
+                    remaining -= len(t)
+                texts.append(t)
+                if max_chars and remaining <= 0:
+                    break
+            profiler.count('annotation_values', len(texts))
+            if len(values) > len(texts):
+                texts.append(f'(+{len(values) - len(texts)} more)')
+            result.append((p, texts))
+        return result
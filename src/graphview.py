@@ -0,0 +1,282 @@
+""" The node/edge model of the views of owl2dot and rdf-viz, and its writers
+
+A view (GraphView) is built once, then written in one or several formats:
+
+    dot       Graphviz
+    graphml   GraphML (yEd, Gephi, networkx...)
+    json      {"nodes": [...], "edges": [...]} for web viewers
+    mermaid   Mermaid flowchart
+
+Each writer renders the whole view in a list of strings that is written to the
+output stream at once.
+
+A node has a title and sections (lists of lines) shown below the title. The
+shape 'record' is drawn as a dot record, the shape 'table' as an HTML table
+(the title and lines may then contain HTML markup), any other shape as a plain
+dot node. The other dot attributes of the nodes and edges are kept in attrs;
+the formats other than dot only use the color.
+"""
+
+from dataclasses import dataclass, field
+from xml.sax.saxutils import escape, quoteattr
+
+import json
+import re
+import sys
+
+
+@dataclass
+class ViewNode:
+    id: str
+    title: str = ''
+    sections: list = field(default_factory=list)   # lists of lines shown below the title
+    shape: str = 'record'                           # record, table or a dot shape
+    html: bool = False                              # the title and lines contain HTML markup
+    cluster: str = None                             # name of the cluster of the node
+    attrs: dict = field(default_factory=dict)       # other dot attributes (color, style...)
+    comment: str = ''
+
+
+@dataclass
+class ViewEdge:
+    source: str
+    target: str
+    label: str = ''
+    html: bool = False
+    attrs: dict = field(default_factory=dict)
+    comment: str = ''
+
+
+class GraphView:
+    """ nodes, edges and comments in the order in which they were added """
+
+    def __init__(self, graph_attrs: dict = None, node_attrs: dict = None):
+        self.graph_attrs = graph_attrs or {}
+        self.node_attrs = node_attrs or {}
+        self.items = []         # nodes, edges and comments (str)
+        self.nodes = {}         # id -> ViewNode
+        self.clusters = {}      # cluster name -> label
+
+    def comment(self, text: str):
+        self.items.append(text)
+
+    def node(self, id: str, title: str = '', **kwargs) -> ViewNode:
+        n = ViewNode(str(id), title, **kwargs)
+        self.items.append(n)
+        self.nodes[n.id] = n
+        return n
+
+    def edge(self, source: str, target: str, label: str = '', **kwargs) -> ViewEdge:
+        e = ViewEdge(str(source), str(target), label, **kwargs)
+        self.items.append(e)
+        return e
+
+    def cluster(self, name: str, label: str):
+        self.clusters[name] = label
+
+    def edges(self) -> list:
+        return [e for e in self.items if isinstance(e, ViewEdge)]
+
+
+class HTML(str):
+    """ a dot attribute value written as an HTML-like label, <...> """
+
+
+def plain(text: str) -> str:
+    """ text without its HTML markup """
+    return re.sub(r'<[^>]*>', '', str(text))
+
+
+# dot
+
+def dot_value(value) -> str:
+    if isinstance(value, HTML):
+        return f'<{value}>'
+    return '"' + str(value).replace('"', '\\"') + '"'
+
+
+def dot_attrs(attrs: dict) -> str:
+    return ', '.join(f'{k}={dot_value(v)}' for k, v in attrs.items())
+
+
+def dot_node(n: ViewNode) -> str:
+    attrs = {}
+    if n.shape == 'record':
+        fields = [n.title.replace('\n', '\\n')] + [''.join(line + '\\l' for line in lines) for lines in n.sections]
+        attrs['label'] = '{' + '|'.join(fields) + '}'
+    elif n.shape == 'table':
+        rows = [f'<tr><td>{n.title}</td></tr>']
+        rows += ['<tr><td align="left">' + ''.join(line + '<BR ALIGN="LEFT"/>' for line in lines) + '</td></tr>'
+                 for lines in n.sections if lines]
+        attrs['shape'] = 'none'
+        attrs['margin'] = '0.05,0.02'
+        attrs['label'] = HTML('<table BORDER="0" CELLBORDER="1" CELLSPACING="0" >' + ''.join(rows) + '</table>')
+    else:
+        attrs['shape'] = n.shape
+        attrs['label'] = HTML(n.title) if n.html else n.title
+    attrs.update(n.attrs)
+    return f'"{n.id}" [{dot_attrs(attrs)}] ;'
+
+
+def dot_edge(e: ViewEdge) -> str:
+    attrs = {}
+    if e.label:
+        attrs['label'] = HTML(e.label) if e.html else e.label
+    attrs.update(e.attrs)
+    return f'"{e.source}" -> "{e.target}" [{dot_attrs(attrs)}] ;'
+
+
+def write_dot(view: GraphView, out):
+    parts = ['digraph {\n']
+    for k, v in view.graph_attrs.items():
+        parts.append(f'  {k}={dot_value(v)}\n')
+    if view.node_attrs:
+        parts.append(f'  node [{dot_attrs(view.node_attrs)}] ;\n')
+    clustered = {}
+    for item in view.items:
+        if isinstance(item, str):
+            parts.append(f'\n  // {item}\n\n')
+            continue
+        if isinstance(item, ViewNode) and item.cluster is not None:
+            # written with its comment in the block of its cluster
+            clustered.setdefault(item.cluster, []).append(item)
+            continue
+        if item.comment:
+            parts.append(f'  // {item.comment}\n')
+        if isinstance(item, ViewNode):
+            parts.append('  ' + dot_node(item) + '\n')
+        else:
+            parts.append('  ' + dot_edge(item) + '\n')
+    for no, (name, nodes) in enumerate(clustered.items()):
+        parts.append(f'  subgraph cluster_{no} {{\n    label={dot_value(view.clusters.get(name, name))} ;\n')
+        for n in nodes:
+            if n.comment:
+                parts.append(f'    // {n.comment}\n')
+            parts.append('    ' + dot_node(n) + '\n')
+        parts.append('  }\n')
+    parts.append('}\n')
+    out.write(''.join(parts))
+
+
+# GraphML
+
+def write_graphml(view: GraphView, out):
+    parts = ['<?xml version="1.0" encoding="UTF-8"?>\n',
+             '<graphml xmlns="http://graphml.graphdrawing.org/xmlns">\n',
+             '  <key id="label" for="node" attr.name="label" attr.type="string"/>\n',
+             '  <key id="description" for="node" attr.name="description" attr.type="string"/>\n',
+             '  <key id="cluster" for="node" attr.name="cluster" attr.type="string"/>\n',
+             '  <key id="color" for="all" attr.name="color" attr.type="string"/>\n',
+             '  <key id="elabel" for="edge" attr.name="label" attr.type="string"/>\n',
+             '  <graph id="G" edgedefault="directed">\n']
+    for n in view.nodes.values():
+        parts.append(f'    <node id={quoteattr(n.id)}>')
+        parts.append(f'<data key="label">{escape(plain(n.title))}</data>')
+        if n.sections:
+            description = '\n'.join(plain(line) for lines in n.sections for line in lines)
+            parts.append(f'<data key="description">{escape(description)}</data>')
+        if n.cluster is not None:
+            parts.append(f'<data key="cluster">{escape(view.clusters.get(n.cluster, n.cluster))}</data>')
+        if 'color' in n.attrs:
+            parts.append(f'<data key="color">{escape(n.attrs["color"])}</data>')
+        parts.append('</node>\n')
+    for no, e in enumerate(view.edges()):
+        parts.append(f'    <edge id="e{no}" source={quoteattr(e.source)} target={quoteattr(e.target)}>')
+        if e.label:
+            parts.append(f'<data key="elabel">{escape(plain(e.label))}</data>')
+        if 'color' in e.attrs:
+            parts.append(f'<data key="color">{escape(e.attrs["color"])}</data>')
+        parts.append('</edge>\n')
+    parts.append('  </graph>\n</graphml>\n')
+    out.write(''.join(parts))
+
+
+# JSON
+
+def write_json(view: GraphView, out):
+    nodes = [{'id': n.id, 'label': plain(n.title),
+              'sections': [[plain(line) for line in lines] for lines in n.sections],
+              'shape': n.shape, 'cluster': view.clusters.get(n.cluster, n.cluster),
+              'color': n.attrs.get('color')}
+             for n in view.nodes.values()]
+    edges = [{'source': e.source, 'target': e.target, 'label': plain(e.label), 'color': e.attrs.get('color')}
+             for e in view.edges()]
+    out.write(json.dumps({'nodes': nodes, 'edges': edges}, ensure_ascii=False, indent=1))
+    out.write('\n')
+
+
+# Mermaid
+
+def mermaid_text(text: str) -> str:
+    return plain(text).replace('"', '#quot;').replace('\n', '<br/>')
+
+
+def write_mermaid(view: GraphView, out):
+    direction = 'BT' if view.graph_attrs.get('rankdir') == 'BT' else 'TB'
+    ids = {}
+    def mid(node_id: str) -> str:
+        if node_id not in ids: ids[node_id] = f'n{len(ids)}'
+        return ids[node_id]
+    parts = [f'flowchart {direction}\n']
+    clustered = {}
+    for n in view.nodes.values():
+        lines = [mermaid_text(n.title)] + [mermaid_text(line) for lines in n.sections for line in lines]
+        decl = f'{mid(n.id)}["{"<br/>".join(lines)}"]'
+        if n.cluster is not None:
+            clustered.setdefault(n.cluster, []).append(decl)
+        else:
+            parts.append(f'  {decl}\n')
+    for no, (name, decls) in enumerate(clustered.items()):
+        parts.append(f'  subgraph c{no} ["{mermaid_text(view.clusters.get(name, name))}"]\n')
+        parts.extend(f'    {decl}\n' for decl in decls)
+        parts.append('  end\n')
+    for e in view.edges():
+        label = f'|"{mermaid_text(e.label)}"|' if plain(e.label).strip() else ''
+        parts.append(f'  {mid(e.source)} -->{label} {mid(e.target)}\n')
+    out.write(''.join(parts))
+
+
+WRITERS = {'dot': write_dot, 'graphml': write_graphml, 'json': write_json, 'mermaid': write_mermaid}
+EXTENSIONS = {'dot': '.dot', 'graphml': '.graphml', 'json': '.json', 'mermaid': '.mmd'}
+
+
+def output_options(argv: list) -> tuple:
+    """ the formats (--format=dot,json...) and the output file name (--output=name)
+    given on the command line
+    """
+    formats = ['dot']
+    output = None
+    for arg in argv:
+        if arg.startswith('--format='):
+            formats = arg[len('--format='):].split(',')
+        elif arg.startswith('--output='):
+            output = arg[len('--output='):]
+    for fmt in formats:
+        if fmt not in WRITERS:
+            raise ValueError(f'unknown format {fmt} (known formats: {", ".join(WRITERS)})')
+    return formats, output
+
+
+def output_paths(formats: list = ('dot',), output: str = None) -> dict:
+    """ the file of each format: output (or 'view') + the format extension, or output
+    itself if there is only one format; {} if the view goes to the standard output
+    """
+    if output is None and len(formats) == 1:
+        return {}
+    base = output or 'view'
+    if len(formats) == 1:
+        return {formats[0]: base}
+    return {fmt: re.sub(r'\.(dot|graphml|json|mmd)$', '', base) + EXTENSIONS[fmt] for fmt in formats}
+
+
+def write_view(view: GraphView, formats: list = ('dot',), output: str = None):
+    """ write the view in each format: to the standard output if there is no output
+    name and only one format, otherwise to output (or 'view') + the format extension
+    """
+    paths = output_paths(formats, output)
+    if not paths:
+        WRITERS[formats[0]](view, sys.stdout)
+        return
+    for fmt, path in paths.items():
+        with open(path, 'w', encoding='utf-8') as f:
+            WRITERS[fmt](view, f)
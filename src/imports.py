@@ -0,0 +1,225 @@
+""" The owl:imports closure of an ontology, read from local files (owl2dot --imports)
+
+The imported ontologies are never fetched from the network: the IRI of an import is
+resolved by the catalogs, which are
+
+    an XML catalog file (e.g. Protégé's catalog-v001.xml), whose <uri name="IRI" uri="file"/>
+    entries map IRIs to files (relative to the catalog)
+
+    a directory, in which an IRI is the file catalog-v001.xml of the directory if it maps it,
+    otherwise the file named like the last segment of the IRI, with or without an RDF
+    extension (http://www.cidoc-crm.org/cidoc-crm/ -> cidoc-crm.ttl, cidoc-crm.owl...)
+
+The closure is read level by level: the documents imported by the documents of a level
+are parsed at the same time, in parallel processes (jobs).
+
+Each parsed document is kept by the hash of its content (SHA-256): a document imported
+several times, or under several IRIs, is parsed once. With a cache directory, the triples
+of the parsed documents are also saved there (hash.pickle) and read back by the next runs
+instead of parsing the document again; a changed document has another hash and is parsed.
+"""
+
+from rdflib import Graph, URIRef
+from rdflib.namespace import RDF, OWL
+from rdflib.term import Node
+from rdflib.util import guess_format
+
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from xml.etree import ElementTree
+
+import hashlib
+import os
+import pickle
+import sys
+
+from profiling import profiler
+
+RDF_EXTENSIONS = ['', '.ttl', '.owl', '.rdf', '.xml', '.nt', '.n3', '.jsonld', '.trig']
+
+
+def imports_options(argv: list) -> tuple:
+    """ the catalogs (--catalog=c, can be repeated), cache directory (--cache=dir) and
+    number of parsing processes (--jobs=n) given on the command line
+    """
+    catalogs = []
+    cache = None
+    jobs = 4
+    for arg in argv:
+        if arg.startswith('--catalog='):
+            catalogs.append(arg[len('--catalog='):])
+        elif arg.startswith('--cache='):
+            cache = arg[len('--cache='):]
+        elif arg.startswith('--jobs='):
+            jobs = int(arg[len('--jobs='):])
+    return catalogs, cache, jobs
+
+
+def read_catalog(path: str) -> dict:
+    """ the IRI -> file entries of an XML catalog """
+    entries = {}
+    base = os.path.dirname(os.path.abspath(path))
+    for element in ElementTree.parse(path).getroot().iter():
+        if element.tag.rsplit('}', 1)[-1] == 'uri' and 'name' in element.attrib and 'uri' in element.attrib:
+            location = element.attrib['uri']
+            if location.startswith('file:'):
+                location = location[len('file:'):]
+            entries[element.attrib['name']] = os.path.join(base, location)
+    return entries
+
+
+class Catalog:
+    """ resolves the IRIs of the imported ontologies to local files """
+
+    def __init__(self, locations: list):
+        self.entries = {}
+        self.directories = []
+        for location in locations:
+            if os.path.isdir(location):
+                self.directories.append(location)
+                location = os.path.join(location, 'catalog-v001.xml')
+                if not os.path.exists(location): continue
+            for iri, path in read_catalog(location).items():
+                self.entries.setdefault(iri, path)
+
+    def resolve(self, iri: str) -> str:
+        """ the file of iri, None if no catalog has it """
+        for key in (iri, iri.rstrip('/#')):
+            if key in self.entries:
+                return self.entries[key]
+        name = iri.rstrip('/#').rsplit('/', 1)[-1]
+        if not name: return None
+        for directory in self.directories:
+            for extension in RDF_EXTENSIONS:
+                path = os.path.join(directory, name + extension)
+                if os.path.isfile(path):
+                    return path
+        return None
+
+
+def content_hash(path: str) -> str:
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def parse_document(path: str, digest: str, cache: str = None) -> tuple:
+    """ the (triples, namespaces, cached) of the document path whose content has the hash
+    digest, read from the cache directory if it is there (run in the parsing processes)
+    """
+    cached = cache and os.path.join(cache, digest + '.pickle')
+    if cached and os.path.exists(cached):
+        try:
+            with open(cached, 'rb') as f:
+                triples, namespaces = pickle.load(f)
+            return triples, namespaces, True
+        except (OSError, pickle.UnpicklingError, EOFError):
+            pass
+    g = Graph()
+    g.parse(path, format=guess_format(path) or 'turtle')
+    triples = list(g)
+    namespaces = [(prefix, str(ns)) for prefix, ns in g.namespaces()]
+    if cached:
+        os.makedirs(cache, exist_ok=True)
+        tmp = f'{cached}.{os.getpid()}.part'
+        with open(tmp, 'wb') as f:
+            pickle.dump((triples, namespaces), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, cached)
+    return triples, namespaces, False
+
+
+@dataclass
+class Module:
+    """ a document of the imports closure """
+    iri: str                    # the ontology IRI (the location of the main document if it has none)
+    path: str
+    digest: str
+    triples: list
+    namespaces: list
+    imports: list = field(default_factory=list)     # IRIs of the ontologies it imports
+
+
+# the parsed documents of this process, by content hash
+_documents = {}
+
+
+def make_module(path: str, digest: str, parsed: tuple) -> Module:
+    triples, namespaces, cached = parsed
+    ontologies = [s for s, p, o in triples if p == RDF.type and o == OWL.Ontology and isinstance(s, URIRef)]
+    ontology = ontologies[0] if ontologies else None
+    imports = [str(o) for s, p, o in triples if p == OWL.imports and s == ontology]
+    module = Module(str(ontology) if ontology is not None else path, path, digest, triples, namespaces, imports)
+    profiler.annotate('module', module.iri, triples=len(triples), cached=cached)
+    return module
+
+
+class ImportsClosure:
+    """ the modules of an ontology and of the ontologies it imports (transitively) """
+
+    def __init__(self, path: str, catalogs: list = (), cache: str = None, jobs: int = 4):
+        # the directory of the ontology is always a catalog
+        self.catalog = Catalog(list(catalogs) + [os.path.dirname(os.path.abspath(path))])
+        self.modules = []
+        self.missing = []       # IRIs of the imports that no catalog has
+        with profiler.phase('parse'):
+            main = self.load([path], cache, None)[0]
+        seen = {main.iri}
+        level = main.imports
+        with profiler.phase('imports'), ProcessPoolExecutor(max_workers=jobs) as executor:
+            while level:
+                paths = []
+                for iri in level:
+                    if iri in seen: continue
+                    seen.add(iri)
+                    path = self.catalog.resolve(iri)
+                    if path is None:
+                        self.missing.append(iri)
+                        print(f'// WARNING // import {iri} not found in the catalogs', file=sys.stderr)
+                    else:
+                        paths.append(path)
+                level = [iri for module in self.load(paths, cache, executor) for iri in module.imports]
+
+    def load(self, paths: list, cache: str, executor) -> list:
+        """ the new modules of the documents paths, parsed in executor if it is not None """
+        pending = {}        # by digest: the documents with the same content are parsed once
+        for path in paths:
+            digest = content_hash(path)
+            if digest in pending:
+                continue
+            if digest in _documents:
+                loaded = _documents[digest]
+            elif executor is not None:
+                loaded = executor.submit(parse_document, path, digest, cache)
+            else:
+                loaded = parse_document(path, digest, cache)
+            pending[digest] = (path, loaded)
+        modules = []
+        for digest, (path, loaded) in pending.items():
+            if digest not in _documents:
+                parsed = loaded.result() if executor is not None else loaded
+                _documents[digest] = make_module(path, digest, parsed)
+            module = _documents[digest]
+            if all(m.digest != digest for m in self.modules):
+                self.modules.append(module)
+                modules.append(module)
+        return modules
+
+    def graph(self) -> Graph:
+        """ the union of the modules """
+        g = Graph()
+        for module in reversed(self.modules):     # the prefixes of the main module win
+            for prefix, ns in module.namespaces:
+                g.bind(prefix, ns, override=True, replace=True)
+            for triple in module.triples:
+                g.add(triple)
+        return g
+
+    def module_of(self) -> dict[Node, str]:
+        """ the module of each resource: the first module (main module first, then in
+        import order) that declares it (gives it an rdf:type)
+        """
+        modules = {}
+        for module in self.modules:
+            for s, p, o in module.triples:
+                if p == RDF.type and s not in modules:
+                    modules[s] = module.iri
+        return modules
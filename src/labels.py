@@ -0,0 +1,111 @@
+""" Label index shared by owl2dot and rdf-viz
+
+The labels of a graph are read once, in one pass over each label property
+(rdfs:label, skos:prefLabel and the configured ones), then the label of a resource
+is a dict lookup.
+
+A label is chosen with an ordered language preference list (e.g. --lang=fr,en):
+the first label property of the resource that has values gives its label, and among
+the values of this property the preference is
+
+    a value without language tag,
+    then a value in the first preferred language, in the second one...
+    then the first value
+"""
+
+from rdflib import Graph, Literal, URIRef
+from rdflib.namespace import RDFS, SKOS
+from rdflib.term import Node
+
+LABEL_PROPERTIES = [RDFS.label, SKOS.prefLabel]
+
+
+def language_option(argv: list, default: str = 'en') -> list:
+    """ the preferred languages of --lang=l1,l2... """
+    languages = default
+    for arg in argv:
+        if arg.startswith('--lang='):
+            languages = arg[len('--lang='):]
+    return [l for l in languages.split(',') if l]
+
+
+def label_properties_option(argv: list) -> list:
+    """ the names of the label properties of --label-props=p1,p2... (IRIs or prefixed names) """
+    names = []
+    for arg in argv:
+        if arg.startswith('--label-props='):
+            names.extend(p for p in arg[len('--label-props='):].split(',') if p)
+    return names
+
+
+def resolve_name(graph: Graph, name: str) -> URIRef:
+    """ the IRI of name, an IRI or a prefixed name known to graph """
+    return URIRef(name) if '://' in name else graph.namespace_manager.expand_curie(name)
+
+
+def label_properties(graph: Graph, names: list) -> list:
+    """ LABEL_PROPERTIES followed by the properties named in names (IRIs or prefixed
+    names known to graph)
+    """
+    properties = list(LABEL_PROPERTIES)
+    for p in names:
+        iri = resolve_name(graph, p)
+        if iri not in properties: properties.append(iri)
+    return properties
+
+
+def choose_label(labels: list, languages: list) -> Literal:
+    """ the preferred label of labels (see above), None if there are none """
+    if not labels:
+        return None
+    for label in labels:
+        if isinstance(label, Literal) and label.language is None:
+            return label
+    for language in languages:
+        for label in labels:
+            if isinstance(label, Literal) and label.language == language:
+                return label
+    return labels[0]
+
+
+def choose_values(values: list, languages: list) -> list:
+    """ the values without language tag (or not literals) and those in the first preferred
+    language that has some; if there are neither, the values in the language of the first one
+    """
+    untagged = [v for v in values if not (isinstance(v, Literal) and v.language)]
+    for language in languages:
+        tagged = [v for v in values if isinstance(v, Literal) and v.language == language]
+        if tagged:
+            return untagged + tagged
+    if untagged or not values:
+        return untagged
+    return [v for v in values if v.language == values[0].language]
+
+
+class LabelIndex:
+
+    def __init__(self, graph: Graph, languages: list = ('en',), properties: list = None):
+        self.languages = list(languages)
+        self.properties = list(properties or LABEL_PROPERTIES)
+        self.values = {}        # resource -> label property -> values, in the order of the properties
+        for p in self.properties:
+            for s, o in graph.subject_objects(p):
+                self.values.setdefault(s, {}).setdefault(p, []).append(o)
+        self.chosen = {}
+
+    def update(self, graph: Graph, resources):
+        """ read again the labels of resources, after their triples changed in graph """
+        for r in resources:
+            self.values.pop(r, None)
+            self.chosen.pop(r, None)
+            for p in self.properties:
+                for o in graph.objects(r, p):
+                    self.values.setdefault(r, {}).setdefault(p, []).append(o)
+
+    def label(self, resource: Node) -> str:
+        """ the preferred label of resource, '' if it has none """
+        if resource not in self.chosen:
+            values = self.values.get(resource)
+            label = choose_label(next(iter(values.values())), self.languages) if values else None
+            self.chosen[resource] = '' if label is None else str(label)
+        return self.chosen[resource]
@@ -15,11 +15,99 @@ OPTIONS:
 
     --alc      use the ALC mathematical symbols, by default use the Manchester syntax (some, exists)
 
-    --annot    display the class annotations (labels, etc.)
+    --annot    display the annotations (labels, comments, etc.) of the visible classes, in the
+               preferred languages (--lang), bounded by:
+
+    --annot-values=n  at most n values per annotation property (default 3, 0: all)
+
+    --annot-chars=n   at most n characters of annotations per class, the last value shown is
+                      truncated (default 300, 0: no limit)
+
+    --annot-include=p1,p2...  show only these annotation properties (IRIs or prefixed names)
+
+    --annot-exclude=p1,p2...  do not show these annotation properties
 
     --bw       use only black, white and gray colors
 
-    --lang=xx  preferred language for labels (default: en)
+    --upper    also show the superclasses (transitively) of all the visible classes
+
+    --lang=xx,yy...  preferred languages for labels, in order (default: en)
+
+    --focus=x  show only the neighborhood of the class x (an IRI, a prefixed name, a label or
+               a local name; can be repeated): the classes at most --depth=k (default 1)
+               subclass, equivalence, restriction, union/intersection, complement or
+               domain/range links away from x, with their descriptions (going through an
+               anonymous class does not count as a link)
+
+    --label-props=p1,p2...  other label properties (IRIs or prefixed names), used when a node
+                            has neither an rdfs:label nor a skos:prefLabel
+
+    --format=f1,f2...  output formats: dot (default), graphml, json, mermaid
+
+    --output=name  write the view in name (name.dot, name.json... with several formats)
+
+    --imports  also read the ontologies imported (owl:imports, transitively) from local files,
+               found by the catalogs, never on the network (see IMPORTS)
+
+    --catalog=c  an XML catalog (e.g. catalog-v001.xml) or a directory of ontology files in
+                 which the imports are looked for; can be repeated. The directory of the
+                 ontology is always searched last
+
+    --cache=dir  keep the parsed imported documents in dir, by content hash, for the next runs
+
+    --jobs=n   number of imported documents parsed, or of batch views rendered, at the same
+               time (default: 4)
+
+    --modules  group the classes by the module (main or imported ontology) that declares them
+
+    --watch    keep running: when the ontology file (or one of its imports) is saved, read it
+               again and rewrite the outputs (--output is required, see WATCH)
+
+    --render=fmt  also run Graphviz dot on the .dot outputs to write name.fmt (e.g. pdf, svg)
+
+    --profile  write on stderr a JSON report of the time, queries, rows, label lookups and
+               peak memory of each phase (parse, genObjRestr...) and of each query
+
+    --batch=views.json  write all the views described in views.json (see BATCH), parsing
+                        the ontology only once
+
+BATCH
+
+    views.json is a list of views, each with an output name and, optionally, formats and
+    options (the other options of the command line are ignored). The views are rendered
+    by --jobs threads that share the parsed ontology:
+
+    [ {"output": "onto.dot"},
+      {"output": "onto-alc", "format": "dot,json", "options": ["--alc", "--annot", "--lang=fr,en"]} ]
+
+IMPORTS
+
+    The IRI of an import is resolved by the <uri name="IRI" uri="file"/> entries of the
+    XML catalogs, then by the file named like the last segment of the IRI in the catalog
+    directories (http://www.cidoc-crm.org/cidoc-crm/ -> cidoc-crm.ttl, .owl, .rdf...).
+    The imports that are not found are reported on stderr and skipped. See imports.py.
+
+WATCH
+
+    The graph, query results, restrictions and label indexes stay in memory. On a change, the
+    file is parsed again and compared with the graph: the resources whose description
+    (triples, with their restrictions, lists and other blank nodes) changed are replaced in
+    the graph, then only the derived results that these triples can change are recomputed:
+    the queries whose triple patterns use one of the changed properties, the restrictions if
+    a restriction triple changed, the labels of the changed resources.
+
+    python3 owl2dot.py onto.ttl --watch --output=onto.dot --render=pdf
+
+LIBRARY
+
+    from owl2dot import OntologyView, ViewOptions
+
+    ontology = OntologyView('onto.ttl')                     # or an rdflib Graph
+    view = ontology.render(ViewOptions(alc=True, languages=['fr', 'en']))   # a graphview.GraphView
+
+    The ontology is parsed once; the query results, restrictions and label indexes are
+    kept and shared by the views rendered from it. Rendering never modifies the graph,
+    so views can be rendered from several threads at the same time.
 
 """
 
@@ -27,18 +115,34 @@ OPTIONS:
 from rdflib import Graph, Literal, URIRef, BNode
 from rdflib import Namespace
 from rdflib.namespace import RDF, RDFS, OWL
-from rdflib.term import Node
+from rdflib.term import Node, Variable
+from rdflib.paths import Path, NegatedPath
+from rdflib.plugins.sparql import prepareQuery
 
 import sys
 import re
-
-from dataclasses import dataclass
+import json
+from xml.sax.saxutils import escape
+import os
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+
+from dataclasses import dataclass, field
+
+from graphview import GraphView, output_options, output_paths, write_view
+from profiling import profiler, profile_option
+from imports import ImportsClosure, imports_options
+from labels import LabelIndex, language_option, label_properties_option, label_properties, resolve_name, LABEL_PROPERTIES
+from annotations import AnnotationIndex
 
 @dataclass
 class DotNode:
     classname: str = ''
-    attributes: str = ''
-    annotations: str = ''
+    attributes: list = field(default_factory=list)     # lines of the node
+    annotations: list = field(default_factory=list)
     isPropRestr: bool = False
     isAnnotVal: bool = False
     isAndOrNot: bool = False
@@ -48,494 +152,1045 @@ SUBCLASS_LINK_COLOR = "orange"
 RESTR_LINK_COLOR = "blue"
 DOM_RNG_LINK_COLOR = "#008800"
 ARG_LINK_COLOR = "magenta"
-PREFERRED_LANGUAGE = "en"
-
-def setBW():
-    global SUBCLASS_LINK_COLOR
-    global RESTR_LINK_COLOR
-    global DOM_RNG_LINK_COLOR
-    global ARG_LINK_COLOR
-    SUBCLASS_LINK_COLOR = "#BBBBBB"
-    RESTR_LINK_COLOR = "black"
-    DOM_RNG_LINK_COLOR = "#333333"
-    ARG_LINK_COLOR = "#666666"
-
-
-
-annot_flag = '--annot' in sys.argv
-alc_flag = '--alc' in sys.argv
-if '--bw' in sys.argv : setBW()
-for arg in sys.argv:
-    if arg.startswith('--lang='):
-        PREFERRED_LANGUAGE = arg[len('--lang='):]
-
-np = Namespace("http://unige.ch/rcnum/")
-np = Namespace("http://humanbehaviourchange.org/ontology/")
-g = Graph()
-g.parse(sys.argv[1])
-# g.bind('e', ne)
-g.bind('', np)
-#g.bind('rdf', RDF)
-
-def makelabel(g: Graph, x: Node) -> str:
-    if type(x) == BNode : return '{BN}'
-    res = get_preferred_label(g, x)
-    if res == '' : res = suffix(x)
-    return res
-
-
-def get_preferred_label(graph: Graph, subject: URIRef) -> str:
-    # subject = URIRef(iri)
-    labels = list(graph.objects(subject, RDFS.label))
-    if not labels:
-        return ""
-    
-    # Try to find a label without a language tag
-    for label in labels:
-        if isinstance(label, Literal) and label.language is None:
-            return str(label)
-    
-    # Try to find a label with a language tag in the preferred language
-    for label in labels:
-        if isinstance(label, Literal) and label.language == PREFERRED_LANGUAGE:
-            return str(label)
-    
-    # Return any label
-    return str(labels[0]) if labels else ""
+
+@dataclass
+class LinkColors:
+    subclass: str = SUBCLASS_LINK_COLOR
+    restr: str = RESTR_LINK_COLOR
+    domRng: str = DOM_RNG_LINK_COLOR
+    arg: str = ARG_LINK_COLOR
+
+BW_COLORS = LinkColors(subclass="#BBBBBB", restr="black", domRng="#333333", arg="#666666")
+
+
+@dataclass
+class ViewOptions:
+    """ the options of a view (see OPTIONS) """
+    alc: bool = False
+    annot: bool = False
+    bw: bool = False
+    upper: bool = False
+    languages: list = field(default_factory=lambda: ['en'])
+    labelProps: list = field(default_factory=list)     # IRIs or prefixed names
+    focus: list = field(default_factory=list)          # IRIs, prefixed names or labels
+    depth: int = 1
+    modules: bool = False
+    annotValues: int = 3
+    annotChars: int = 300
+    annotInclude: list = None      # IRIs or prefixed names, None: all the annotation properties
+    annotExclude: list = field(default_factory=list)
+
+    @staticmethod
+    def fromArgs(argv: list) -> 'ViewOptions':
+        options = ViewOptions(alc='--alc' in argv, annot='--annot' in argv, bw='--bw' in argv,
+                              upper='--upper' in argv, modules='--modules' in argv,
+                              languages=language_option(argv),
+                              labelProps=label_properties_option(argv))
+        for arg in argv:
+            if arg.startswith('--focus='):
+                options.focus.append(arg[len('--focus='):])
+            elif arg.startswith('--depth='):
+                options.depth = int(arg[len('--depth='):])
+            elif arg.startswith('--annot-values='):
+                options.annotValues = int(arg[len('--annot-values='):])
+            elif arg.startswith('--annot-chars='):
+                options.annotChars = int(arg[len('--annot-chars='):])
+            elif arg.startswith('--annot-include='):
+                options.annotInclude = (options.annotInclude or []) + [p for p in arg[len('--annot-include='):].split(',') if p]
+            elif arg.startswith('--annot-exclude='):
+                options.annotExclude = options.annotExclude + [p for p in arg[len('--annot-exclude='):].split(',') if p]
+        return options
+
+    def colors(self) -> LinkColors:
+        return BW_COLORS if self.bw else LinkColors()
+
 
 def suffix(x: str):
     return re.sub(r'.*(#|/)','', x).replace('-','_')
 
 
-def genObjRestr(g: Graph, nodeLabels : dict[Node, DotNode], visibleNodes: set[Node]):
-    """ 
-    Represent restrictions on object properties
+OBJ_RESTRICTION_OPS = [(op, OWL[op[len('owl:'):]]) for op in [
+        "owl:someValuesFrom", "owl:allValuesFrom",
+        "owl:cardinality", "owl:maxCardinality", "owl:minCardinality",
+        "owl:qualifiedCardinality", "owl:maxQualifiedCardinality", "owl:minQualifiedCardinality",
+        "owl:hasValue"]]
+
+def objectRestrictions(g: Graph) -> dict[Node, list[tuple]]:
+    """
+    The restrictions on object properties, read in one pass over the owl:Restriction nodes:
+    for each operator of OBJ_RESTRICTION_OPS, the (rst, p, y, c) of the restrictions
+    rst owl:onProperty p ; <operator> y [; owl:onClass c]  where p is an owl:ObjectProperty
+    """
+    restrictions = {opIRI: {} for _, opIRI in OBJ_RESTRICTION_OPS}
+    objectProperties = set(g.subjects(RDF.type, OWL.ObjectProperty))
+    for rst in set(g.subjects(RDF.type, OWL.Restriction)):
+        props = [p for p in g.objects(rst, OWL.onProperty) if p in objectProperties]
+        if not props: continue
+        classes = list(g.objects(rst, OWL.onClass)) or [None]
+        for _, opIRI in OBJ_RESTRICTION_OPS:
+            for y in g.objects(rst, opIRI):
+                for p in props:
+                    for c in classes:
+                        restrictions[opIRI][(rst, p, y, c)] = None
+    return {opIRI: list(rows) for opIRI, rows in restrictions.items()}
+
+def listOwners(g: Graph) -> dict[Node, dict]:
+    """ the unionOf/intersectionOf classes of each node of their argument lists """
+    owners = {}
+    for op in (OWL.unionOf, OWL.intersectionOf):
+        for x, head in g.subject_objects(op):
+            todo = [head]
+            seen = set()
+            while todo:
+                node = todo.pop()
+                if node in seen: continue
+                seen.add(node)
+                owners.setdefault(node, {})[x] = None
+                todo.extend(g.objects(node, RDF.rest))
+    return owners
+
+def restrictionContexts(g: Graph, restrictions: list[tuple], shortcut: str, suppressed: set = frozenset(),
+                        owners: dict = None) -> list[tuple]:
+    """
+    The (x, rst, p, y, c, arg) rows of the restrictions in the context of the shortcut:
+        'sc'     x rdfs:subClassOf rst
+        'arg'    rst is the argument arg of the union/intersection x
+        'other'  any other restriction used in a triple (x and arg are None)
+    ignoring the suppressed triples. The rows are computed before they are drawn, which
+    suppresses the triples of the shortcuts. owners is listOwners(g), computed if not given
+    """
+    rows = []
+    if shortcut == 'sc':
+        for (rst, p, y, c) in restrictions:
+            for x in g.subjects(RDFS.subClassOf, rst):
+                if (x, RDFS.subClassOf, rst) not in suppressed:
+                    rows.append((x, rst, p, y, c, None))
+    elif shortcut == 'arg':
+        if owners is None:
+            owners = listOwners(g) if restrictions else {}
+        for (rst, p, y, c) in restrictions:
+            for arg in g.subjects(RDF.first, rst):
+                if (arg, RDF.first, rst) in suppressed: continue
+                for x in owners.get(arg, ()):
+                    rows.append((x, rst, p, y, c, arg))
+    else:
+        for (rst, p, y, c) in restrictions:
+            if any((s, q, rst) not in suppressed for s, q in g.subject_predicates(rst)) or \
+                    any((rst, RDFS.subClassOf, o) not in suppressed for o in g.objects(rst, RDFS.subClassOf)):
+                rows.append((None, rst, p, y, c, None))
+    return list(dict.fromkeys(rows))
 
-    A restriction R <restriction> D is represented as
+def superclassEdges(g: Graph, nodes: set[Node]) -> list[tuple[Node, Node]]:
+    """
+    The (x, y) with n rdfs:subClassOf* x and x rdfs:subClassOf y for a node n of nodes and
+    y not an owl:Restriction, found in one traversal of the subclass hierarchy from all
+    the nodes at once (each class of the hierarchy is visited once)
+    """
+    restrictions = set(g.subjects(RDF.type, OWL.Restriction))
+    edges = {}
+    seen = set()
+    todo = [n for n in nodes if isinstance(n, URIRef)]
+    while todo:
+        x = todo.pop()
+        if x in seen: continue
+        seen.add(x)
+        for y in g.objects(x, RDFS.subClassOf):
+            if y not in restrictions: edges[(x, y)] = None
+            todo.append(y)
+    return list(edges)
+
+
+# the links between classes (and anonymous class expressions) followed by --focus
+CLASS_LINKS = [RDFS.subClassOf, OWL.equivalentClass,
+               OWL.someValuesFrom, OWL.allValuesFrom, OWL.onClass, OWL.hasValue,
+               OWL.unionOf, OWL.intersectionOf, OWL.complementOf, RDF.first, RDF.rest]
+
+def focusNodes(g: Graph, names: list[str], labelProps: list = LABEL_PROPERTIES) -> list[Node]:
+    """ the nodes named by IRIs, prefixed names, labels (case-insensitive) or local names """
+    nodes = []
+    for name in names:
+        if '://' in name:
+            nodes.append(URIRef(name))
+            continue
+        if ':' in name:
+            try:
+                nodes.append(g.namespace_manager.expand_curie(name))
+                continue
+            except ValueError:
+                pass
+        found = {s: None for p in labelProps for s, o in g.subject_objects(p)
+                 if isinstance(o, Literal) and str(o).lower() == name.lower()}
+        if not found:   # a local name
+            found = {s: None for s in g.subjects(RDF.type, None)
+                     if isinstance(s, URIRef) and re.sub(r'.*(#|/)', '', s) == name}
+        if not found:
+            raise ValueError(f'--focus={name}: no class with this IRI or label')
+        nodes.extend(found)
+    return nodes
+
+def classNeighbors(g: Graph, n: Node):
+    """ the nodes linked to n by a CLASS_LINKS triple (in either direction) or by a property
+    with n as domain or range
+    """
+    for p in CLASS_LINKS:
+        yield from g.objects(n, p)
+        yield from g.subjects(p, n)
+    for link in (RDFS.domain, RDFS.range):
+        for prop in g.subjects(link, n):
+            yield from g.objects(prop, RDFS.domain)
+            yield from g.objects(prop, RDFS.range)
+
+def neighborhood(g: Graph, focus: list[Node], depth: int) -> set[Node]:
+    """
+    The named classes at most depth links away from the focus nodes, found by a
+    breadth-first search from the focus (0-1 BFS: going through a blank node, i.e. an
+    anonymous class expression, a restriction or a list, does not count as a link).
+    Only the visited nodes are read, so the cost depends on the size of the neighborhood
+    """
+    dist = {n: 0 for n in focus}
+    todo = deque(focus)
+    while todo:
+        n = todo.popleft()
+        d = dist[n]
+        for m in classNeighbors(g, n):
+            if isinstance(m, Literal): continue
+            dm = d if isinstance(m, BNode) else d + 1
+            if dm > depth or (m in dist and dist[m] <= dm): continue
+            dist[m] = dm
+            if isinstance(m, BNode): todo.appendleft(m)
+            else: todo.append(m)
+    return {n for n in dist if not isinstance(n, BNode)}
+
+def sliceGraph(g: Graph, nodes: set[Node], labelProps: list[Node]) -> Graph:
+    """
+    The subgraph that describes the nodes: their triples, with the triples of the blank
+    nodes they lead to (restrictions, lists...), the properties that have one of the nodes
+    as domain or range, and the types and labels of the other resources these triples use
+    """
+    s = Graph()
+    for prefix, ns in g.namespaces():
+        s.bind(prefix, ns, override=True, replace=True)
+    described = set()
+    todo = list(nodes)
+    for n in nodes:
+        for link in (RDFS.domain, RDFS.range):
+            for prop in g.subjects(link, n):
+                for p in (RDF.type, RDFS.domain, RDFS.range):
+                    for o in g.objects(prop, p):
+                        s.add((prop, p, o))
+    while todo:
+        n = todo.pop()
+        if n in described: continue
+        described.add(n)
+        for p, o in g.predicate_objects(n):
+            s.add((n, p, o))
+            if isinstance(o, BNode): todo.append(o)
+    used = {t for triple in s for t in triple if isinstance(t, URIRef)}
+    for r in used:
+        for p in [RDF.type] + labelProps:
+            for o in g.objects(r, p):
+                s.add((r, p, o))
+    return s
+
+
+def describedTriples(g: Graph, node: Node) -> list[tuple]:
+    """ the triples of node and of the blank nodes it leads to """
+    triples = []
+    seen = set()
+    todo = [node]
+    while todo:
+        n = todo.pop()
+        if n in seen: continue
+        seen.add(n)
+        for p, o in g.predicate_objects(n):
+            triples.append((n, p, o))
+            if isinstance(o, BNode): todo.append(o)
+    return triples
+
+def signer(g: Graph):
+    """ the function that writes a node of g as a text, a blank node by its content (so two
+    parses of the same file give the same texts)
+    """
+    memo = {}
+    def signature(n: Node, path: set = None) -> str:
+        if not isinstance(n, BNode): return n.n3()
+        if n in memo: return memo[n]
+        path = path or set()
+        if n in path: return '[cycle]'
+        path.add(n)
+        memo[n] = '[' + ' ; '.join(sorted(f'{p.n3()} {signature(o, path)}' for p, o in g.predicate_objects(n))) + ']'
+        path.discard(n)
+        return memo[n]
+    return signature
+
+def descriptionParts(g: Graph, node: Node, signature) -> dict[str, list[tuple]]:
+    """ the triples of node, each with the triples of the blank nodes it leads to, by the
+    text of their property and object
+    """
+    parts = {}
+    for p, o in g.predicate_objects(node):
+        triples = [(node, p, o)] + (describedTriples(g, o) if isinstance(o, BNode) else [])
+        parts.setdefault(f'{p.n3()} {signature(o)}', []).extend(triples)
+    return parts
 
-            ┌────┐     <restriction> R     ┌─────┐
-            │    │ ----------------------> │  D  │
-            └────┘                         └─────┘
+def descriptions(g: Graph) -> dict:
+    """
+    The description of each resource of g: key -> (signature, node), where the signature is
+    the text of the triples of the node and of the blank nodes it leads to (see signer).
+    The key is the node itself for an IRI, the signature for a blank node that is not the
+    object of a triple (e.g. an owl:AllDisjointClasses axiom).
+    None if a blank node is the object of several triples (its description is not a tree)
+    """
+    incoming = {}
+    for o in g.objects():
+        if isinstance(o, BNode):
+            incoming[o] = incoming.get(o, 0) + 1
+            if incoming[o] > 1: return None
+    signature = signer(g)
+    result = {}
+    for s in set(g.subjects()):
+        if isinstance(s, BNode):
+            if s in incoming: continue
+            result[signature(s)] = (signature(s), s)
+        else:
+            result[s] = (' ; '.join(sorted(descriptionParts(g, s, signature))), s)
+    return result
 
-    If the restriction is a superclass there is a shortcut : C ⊑ R <restriction> D is represented as
+def queryDependencies(q: str, namespaces: dict):
+    """
+    (properties, types) such that the rows of the query q can only change when a triple
+    of one of the properties changes, or of a property that has one of the types
+    (for the variable properties of patterns such as ?a a owl:AnnotationProperty . ?x ?a ?y);
+    None if q depends on any triple
+    """
+    def triples(node):
+        if isinstance(node, dict):
+            for k, v in node.items():
+                if k == 'triples': yield from v
+                else: yield from triples(v)
+        elif isinstance(node, (list, tuple)):
+            for v in node: yield from triples(v)
+    def pathProperties(path) -> set:
+        if isinstance(path, URIRef): return {path}
+        if isinstance(path, NegatedPath) or not isinstance(path, Path): return None
+        props = set()
+        for part in getattr(path, 'args', None) or [getattr(path, 'path', None) or getattr(path, 'arg', None)]:
+            sub = pathProperties(part)
+            if sub is None: return None
+            props |= sub
+        return props
+    patterns = list(triples(prepareQuery(q, initNs=namespaces).algebra))
+    props, types = set(), set()
+    for s, p, o in patterns:
+        if isinstance(p, Variable):
+            pTypes = {t for (x, y, t) in patterns if x == p and y == RDF.type and isinstance(t, URIRef)}
+            if not pTypes: return None
+            types |= pTypes
+        else:
+            sub = pathProperties(p)
+            if sub is None: return None
+            props |= sub
+    return props, types
 
-                ┌────┐     <restriction> R     ┌─────┐
-                │ C  │ ----------------------> │  D  │
-                └────┘                         └─────┘
+RESTRICTION_PROPERTIES = {RDF.type, OWL.onProperty, OWL.onClass} | {opIRI for _, opIRI in OBJ_RESTRICTION_OPS}
+LIST_PROPERTIES = {OWL.unionOf, OWL.intersectionOf, RDF.first, RDF.rest}
 
-    The same shortcut is applied to Union/Intersection : A1 union R <restriction> D ... =>
 
-                ┌────┐           ┌────┐     <restriction> R     ┌─────┐
-                │ A1 │ <-------- │ OR │ ----------------------> │  D  │
-                └────┘           └────┘                         └─────┘
+class OntologyView:
+    """
+    An ontology parsed once, from which any number of views are rendered
 
+    The structures that do not depend on the view options are computed once and kept:
+    the query results, the restrictions on object properties, the label index of each
+    language preference. When the source file changes, reload() updates them (see WATCH).
     """
-    # restrictions on object properties
-    # SOME and ONLY on object property -> [node]
-    args = set()
-    objrestr = set()
-    subc = set()
-    print('''
-    
-    // Restrictions
-    
-    ''')
-    optSc = """?x rdfs:subClassOf ?rst"""
-    optArg = """?x (owl:unionOf|owl:intersectionOf)/rdf:rest* ?arg. ?arg rdf:first ?rst"""
-    optOther = """{{ {{ ?z ?someLinkTo ?rst }} UNION {{ ?rst rdfs:subClassOf|owl:equivalenClass ?z}} }}"""
-
-    loopNo = 0
-    for shortcut in [optSc, optArg, optOther]:
-        for op in ["owl:someValuesFrom", "owl:allValuesFrom", 
-                "owl:cardinality", "owl:maxCardinality", "owl:minCardinality", 
-                "owl:qualifiedCardinality", "owl:maxQualifiedCardinality", "owl:minQualifiedCardinality",
-                "owl:hasValue"]:
-            q_restriction = f"""
-                        SELECT DISTINCT ?x ?rst ?p ?y ?c ?arg
-                        WHERE {{
-                                ?rst rdf:type owl:Restriction ;  owl:onProperty ?p  ; {op} ?y .    
-                                ?p rdf:type owl:ObjectProperty .
-                                OPTIONAL {{?rst owl:onClass ?c}}
-                                {shortcut}
-                        }}
-            """ 
-            qres = g.query(q_restriction)
-            for r in qres:
-                target = r.y
-                arclabel = makelabel(g, r.p)
-                print(f"// {op} {arclabel} {r.y}")
-                if op == "owl:someValuesFrom":
-                    # ALT arclabel = '∃ ' + arclabel
-                    arclabel = f''' ∃ <B>{arclabel}</B>''' if alc_flag else f'''<B>  {arclabel}</B>  some'''
-                elif op == "owl:allValuesFrom":
-                    # ALT arclabel = '∀ ' + arclabel
-                    arclabel = f''' ∀ <B>{arclabel}</B>''' if alc_flag else f'''<B>  {arclabel}</B> only'''
-                elif op == "owl:cardinality":
-                    target = "owl:Thing"
-                    arclabel = "= " + r.y + ' ' + arclabel
-                elif op == "owl:maxCardinality":
-                    target = "owl:Thing"
-                    arclabel = "≤ " + r.y + ' ' + arclabel
-                elif op == "owl:minCardinality":
-                    target = "owl:Thing"
-                    arclabel = "≥ " + r.y  + ' ' + arclabel              
-                elif op == "owl:qualifiedCardinality":
-                    arclabel = "= " + r.y + ' ' + arclabel
-                    target = r.c
-                elif op == "owl:maxQualifiedCardinality":
-                    arclabel = "≤ " + r.y + ' ' + arclabel
-                    target = r.c
-                elif op == "owl:minQualifiedCardinality":
-                    arclabel = "≥ " + r.y + ' ' + arclabel
-                    target = r.c
-                elif op == "owl:hasValue":
-                    arclabel = arclabel + " (has value)" 
-                    target = r.y
-                else:
-                    arclabel = "** ERROR **"
 
-                if shortcut == optSc:
-                    if target == r.x : # loop
-                        loopNo += 1
-                        print(f""" "{r.x}":n -> "{target}":s [color = "{RESTR_LINK_COLOR}", label=<{arclabel}>] // shortcut 1""")
-                    else:
-                        print(f""" "{r.x}" -> "{target}" [color = "{RESTR_LINK_COLOR}", label=<{arclabel}>] // shortcut 1""")
-                    visibleNodes.add(r.x)
-                    visibleNodes.add(target)
-                    g.remove((r.x, RDFS.subClassOf, r.rst))
-                    # print(f'''///// removed {(r.x, RDFS.subClassOf, r.rst)}''')
-                elif shortcut == optArg:
-                    print(f""" "{r.x}" -> "{target}" [color = "{RESTR_LINK_COLOR}", label=<{arclabel}>] // shortcut 1""")
-                    visibleNodes.add(r.x)
-                    visibleNodes.add(target)
-                    g.remove((r.arg, RDF.first, r.rst))
-                else:    
-                    print(f""" "{r.rst}" -> "{target}" [color = "black" label=<{arclabel}>]""")           
-                    nodeLabels[r.rst] = DotNode(isPropRestr=True) #'PROP_RESTR#'+suffix(r.p)  # This is to indicate that this node represents a property restriction
-                    objrestr.add(r.rst)
-                    visibleNodes.add(r.rst)
-                    visibleNodes.add(target)
+    def __init__(self, source, imports: bool = False, catalogs: list = (), cache: str = None, jobs: int = 4):
+        """ source: the location of the ontology (file or URL), or an rdflib Graph
+        imports: also read the imports closure of the ontology (a file) with these catalogs
+        """
+        self.source = source
+        self.imports = imports
+        self.importOptions = (catalogs, cache, jobs)
+        self.moduleOf = {}      # resource -> IRI of the module that declares it (with imports)
+        self.parent = None      # the whole ontology of a --focus slice
+        self.files = []         # the files read, watched by --watch
+        self.g = source if isinstance(source, Graph) else self.parse()
+        self.queryResults = {}
+        self.queryDeps = {}
+        self.lock = threading.RLock()      # the caches are filled by one thread at a time
+        self.labelIndexes = {}
+        self.objRestrictions = None
+        self.owners = None
+        self.annotIndex = None
+        self.slices = {}
+        self.descriptions = None
+
+    def parse(self) -> Graph:
+        """ a new graph of the source (and of its imports) """
+        if self.imports:
+            closure = ImportsClosure(self.source, *self.importOptions)
+            g = closure.graph()
+            self.moduleOf = closure.module_of()
+            self.files = [module.path for module in closure.modules]
+        else:
+            g = Graph()
+            with profiler.phase('parse'):
+                g.parse(self.source)
+            self.files = [self.source] if os.path.exists(self.source) else []
+        np = Namespace("http://unige.ch/rcnum/")
+        np = Namespace("http://humanbehaviourchange.org/ontology/")
+        # g.bind('e', ne)
+        g.bind('', np)
+        #g.bind('rdf', RDF)
+        return g
+
+    def query(self, q: str) -> list:
+        """ the rows of the query q, evaluated once
+
+        The renderings never modify the graph (the triples they hide are in their
+        suppressed set), so the rows of a query are the same for every view
+        """
+        with self.lock:
+            if q not in self.queryResults:
+                self.queryResults[q] = list(profiler.query(self.g, q))
+            return self.queryResults[q]
+
+    def invalidate(self, properties: set):
+        """ forget the rows of the queries that can change with triples of these properties """
+        for q in list(self.queryResults):
+            if q not in self.queryDeps:
+                self.queryDeps[q] = queryDependencies(q, dict(self.g.namespaces()))
+            deps = self.queryDeps[q]
+            if deps is None or deps[0] & properties or \
+                    any((p, RDF.type, t) in self.g for p in properties for t in deps[1]):
+                del self.queryResults[q]
+                profiler.count('invalidated_queries')
+
+    def reload(self) -> int:
+        """ parse the source again and update the graph and the derived structures with
+        the descriptions that changed; the number of changed descriptions
+        """
+        g = self.parse()
+        with profiler.phase('update'):
+            for prefix, ns in g.namespaces():
+                self.g.bind(prefix, ns, override=True, replace=True)
+            if self.descriptions is None:
+                self.descriptions = descriptions(self.g)
+            new = descriptions(g)
+            if self.descriptions is None or new is None:
+                self.g = g      # not trees: everything is computed again
+                self.queryResults, self.labelIndexes, self.objRestrictions, self.annotIndex = {}, {}, None, None
+                self.owners = None
+                self.slices, self.descriptions = {}, new
+                return len(new or ())
+            changed = [k for k in self.descriptions.keys() | new.keys()
+                       if self.descriptions.get(k, (None,))[0] != new.get(k, (None,))[0]]
+            # the triples of the parts (a property and its object) of the descriptions that changed
+            removed, added = [], []
+            oldSignature, newSignature = signer(self.g), signer(g)
+            for k in changed:
+                oldParts = descriptionParts(self.g, self.descriptions[k][1], oldSignature) if k in self.descriptions else {}
+                newParts = descriptionParts(g, new[k][1], newSignature) if k in new else {}
+                removed.extend(t for part, triples in oldParts.items() if part not in newParts for t in triples)
+                added.extend(t for part, triples in newParts.items() if part not in oldParts for t in triples)
+            for triple in removed: self.g.remove(triple)
+            for triple in added: self.g.add(triple)
+            for k in changed:
+                if k in new: self.descriptions[k] = new[k]
+                else: del self.descriptions[k]
+            properties = {p for _, p, _ in removed + added}
+            self.invalidate(properties)
+            if properties & RESTRICTION_PROPERTIES:
+                self.objRestrictions = None
+            if properties & LIST_PROPERTIES:
+                self.owners = None
+            subjects = {s for s, _, _ in removed + added}
+            for index in self.labelIndexes.values():
+                index.update(self.g, subjects)
+            if RDF.type in properties:      # the annotation properties may have changed
+                self.annotIndex = None
+            elif self.annotIndex is not None:
+                self.annotIndex.update(self.g, subjects)
+            self.slices = {}
+            profiler.count('changed_descriptions', len(changed))
+            return len(changed)
+
+    def restrictions(self) -> dict[Node, list[tuple]]:
+        with self.lock:
+            if self.objRestrictions is None:
+                self.objRestrictions = objectRestrictions(self.g)
+            return self.objRestrictions
+
+    def labelIndex(self, languages: list, labelProps: list) -> LabelIndex:
+        key = (tuple(languages), tuple(labelProps))
+        with self.lock:
+            if key not in self.labelIndexes:
+                with profiler.phase('labelIndex'):
+                    self.labelIndexes[key] = LabelIndex(self.g, languages, label_properties(self.g, labelProps))
+            return self.labelIndexes[key]
+
+    def listOwners(self) -> dict[Node, dict]:
+        with self.lock:
+            if self.owners is None:
+                self.owners = listOwners(self.g)
+            return self.owners
+
+    def annotationIndex(self) -> AnnotationIndex:
+        with self.lock:
+            if self.annotIndex is None:
+                with profiler.phase('annotationIndex'):
+                    self.annotIndex = AnnotationIndex(self.g)
+            return self.annotIndex
+
+    def whole(self) -> 'OntologyView':
+        """ the whole ontology: self, or the ontology of which self is a --focus slice """
+        return self.parent.whole() if self.parent is not None else self
+
+    def focus(self, names: list[str], depth: int, labelProps: list = ()) -> 'OntologyView':
+        """ the OntologyView of the neighborhood of the named classes (see --focus) """
+        key = (tuple(names), depth, tuple(labelProps))
+        with self.lock:
+            if key not in self.slices:
+                with profiler.phase('focus'):
+                    properties = label_properties(self.g, labelProps)
+                    nodes = neighborhood(self.g, focusNodes(self.g, names, properties), depth)
+                    self.slices[key] = OntologyView(sliceGraph(self.g, nodes, properties))
+                    self.slices[key].moduleOf = self.moduleOf
+                    self.slices[key].parent = self
+            return self.slices[key]
+
+    def render(self, options: ViewOptions = None) -> GraphView:
+        """ the view of the ontology with these options """
+        options = options or ViewOptions()
+        if options.focus:
+            return self.focus(options.focus, options.depth, options.labelProps).render(
+                ViewOptions(**{**options.__dict__, 'focus': []}))
+        return ViewBuilder(self, options).build()
+
+
+class ViewBuilder:
+    """ Builds one view of an OntologyView
+
+    The graph is only read: the triples drawn as shortcuts by genObjRestr are put in the
+    suppressed set of the builder, and the later phases skip them, so several views can
+    be built at the same time from the same OntologyView
+    """
+
+    def __init__(self, ontology: OntologyView, options: ViewOptions):
+        self.ontology = ontology
+        self.g = ontology.g
+        self.options = options
+        self.colors = options.colors()
+        # the labels and annotations of the whole ontology, the --upper classes may be outside a slice
+        self.labelIndex = ontology.whole().labelIndex(options.languages, options.labelProps)
+        self.view = GraphView(graph_attrs={'rankdir': 'BT'})
+        self.suppressed = set()     # the triples hidden in this view
+
+    def makelabel(self, x: Node) -> str:
+        if type(x) == BNode : return '{BN}'
+        profiler.count('label_lookups')
+        res = self.labelIndex.label(x)
+        if res == '' : res = suffix(x)
+        return res
+
+    def suppress(self, triple: tuple):
+        """ hide a triple from the next phases of the rendering """
+        self.suppressed.add(triple)
+
+    def genObjRestr(self, nodeLabels : dict[Node, DotNode], visibleNodes: set[Node]):
+        """ 
+        Represent restrictions on object properties
+
+        A restriction R <restriction> D is represented as
+
+                ┌────┐     <restriction> R     ┌─────┐
+                │    │ ----------------------> │  D  │
+                └────┘                         └─────┘
+
+        If the restriction is a superclass there is a shortcut : C ⊑ R <restriction> D is represented as
 
-                # args.add(target)
+                    ┌────┐     <restriction> R     ┌─────┐
+                    │ C  │ ----------------------> │  D  │
+                    └────┘                         └─────┘
 
+        The same shortcut is applied to Union/Intersection : A1 union R <restriction> D ... =>
+
+                    ┌────┐           ┌────┐     <restriction> R     ┌─────┐
+                    │ A1 │ <-------- │ OR │ ----------------------> │  D  │
+                    └────┘           └────┘                         └─────┘
+
+        """
+        # restrictions on object properties
+        # SOME and ONLY on object property -> [node]
+        args = set()
+        objrestr = set()
+        subc = set()
+        self.view.comment('Restrictions')
+        restrictions = self.ontology.restrictions()
+        owners = self.ontology.listOwners() if any(restrictions.values()) else {}
+
+        loopNo = 0
+        for shortcut in ['sc', 'arg', 'other']:
+            for op, opIRI in OBJ_RESTRICTION_OPS:
+                for (x, rst, p, y, c, arg) in restrictionContexts(self.g, restrictions[opIRI], shortcut, self.suppressed, owners):
+                    target = y
+                    arclabel = self.makelabel(p)
+                    comment = f"{op} {arclabel} {y}"
+                    if op == "owl:someValuesFrom":
+                        # ALT arclabel = '∃ ' + arclabel
+                        arclabel = f''' ∃ <B>{arclabel}</B>''' if self.options.alc else f'''<B>  {arclabel}</B>  some'''
+                    elif op == "owl:allValuesFrom":
+                        # ALT arclabel = '∀ ' + arclabel
+                        arclabel = f''' ∀ <B>{arclabel}</B>''' if self.options.alc else f'''<B>  {arclabel}</B> only'''
+                    elif op == "owl:cardinality":
+                        target = "owl:Thing"
+                        arclabel = "= " + y + ' ' + arclabel
+                    elif op == "owl:maxCardinality":
+                        target = "owl:Thing"
+                        arclabel = "≤ " + y + ' ' + arclabel
+                    elif op == "owl:minCardinality":
+                        target = "owl:Thing"
+                        arclabel = "≥ " + y  + ' ' + arclabel              
+                    elif op == "owl:qualifiedCardinality":
+                        arclabel = "= " + y + ' ' + arclabel
+                        target = c
+                    elif op == "owl:maxQualifiedCardinality":
+                        arclabel = "≤ " + y + ' ' + arclabel
+                        target = c
+                    elif op == "owl:minQualifiedCardinality":
+                        arclabel = "≥ " + y + ' ' + arclabel
+                        target = c
+                    elif op == "owl:hasValue":
+                        arclabel = arclabel + " (has value)" 
+                        target = y
+                    else:
+                        arclabel = "** ERROR **"
+
+                    if shortcut == 'sc':
+                        if target == x : # loop
+                            loopNo += 1
+                            self.view.edge(x, target, arclabel, html=True, comment=comment + ' (shortcut 1)',
+                                      attrs={'color': self.colors.restr, 'tailport': 'n', 'headport': 's'})
+                        else:
+                            self.view.edge(x, target, arclabel, html=True, comment=comment + ' (shortcut 1)',
+                                      attrs={'color': self.colors.restr})
+                        visibleNodes.add(x)
+                        visibleNodes.add(target)
+                        self.suppress((x, RDFS.subClassOf, rst))
+                    elif shortcut == 'arg':
+                        self.view.edge(x, target, arclabel, html=True, comment=comment + ' (shortcut 1)',
+                                  attrs={'color': self.colors.restr})
+                        visibleNodes.add(x)
+                        visibleNodes.add(target)
+                        self.suppress((arg, RDF.first, rst))
+                        subc.add((x, rst))      # the argument edge x -> rst is not drawn by genAndOr
+                    else:    
+                        self.view.edge(rst, target, arclabel, html=True, comment=comment, attrs={'color': 'black'})
+                        nodeLabels[rst] = DotNode(isPropRestr=True) #'PROP_RESTR#'+suffix(p)  # This is to indicate that this node represents a property restriction
+                        objrestr.add(rst)
+                        visibleNodes.add(rst)
+                        visibleNodes.add(target)
+
+                    # args.add(target)
             
             
-    return (objrestr, args, subc)
-
-def genDatatypeRestr(g: Graph, nodeLabels: dict[Node,DotNode], visibleNodes: set[Node]) -> set[str]:
-    """ 
-    Represents datatype restrictions as lines in the class node label
-
-    C ⊑ R Θ DType  (where either R is a dt property or DType is data class)
-    ---> 
-        _____________
-        | C          |
-        |------------|
-        | R : DType  |
-    """
-    print("""
-    
-    /// Datatype Property Restrictions -> Attributes
-    
-    """)
-    restrictionOnDatatype = set() 
-    q = f"""
-                SELECT DISTINCT ?x ?p ?y ?rstr
-                WHERE {{ ?x rdfs:subClassOf ?rstr .
-                        ?rstr rdf:type owl:Restriction ;  owl:onProperty ?p .
-                        {{ 
-                            ?p rdf:type owl:DatatypeProperty . ?rstr owl:someValuesFrom|owl:allValuesFrom|owl:onDataRange ?y
-                        }}
-                        UNION
-                        {{ 
-                            ?rstr owl:someValuesFrom|owl:allValuesFrom|owl:onDataRange ?y FILTER(STRSTARTS(STR(?y), "http://www.w3.org/2001/XMLSchema#"))
+        return (objrestr, args, subc)
+
+    def genDatatypeRestr(self, nodeLabels: dict[Node,DotNode], visibleNodes: set[Node]) -> set[str]:
+        """ 
+        Represents datatype restrictions as lines in the class node label
+
+        C ⊑ R Θ DType  (where either R is a dt property or DType is data class)
+        ---> 
+            _____________
+            | C          |
+            |------------|
+            | R : DType  |
+        """
+        self.view.comment('Datatype Property Restrictions -> Attributes')
+        restrictionOnDatatype = set() 
+        q = f"""
+                    SELECT DISTINCT ?x ?p ?y ?rstr
+                    WHERE {{ ?x rdfs:subClassOf ?rstr .
+                            ?rstr rdf:type owl:Restriction ;  owl:onProperty ?p .
+                            {{ 
+                                ?p rdf:type owl:DatatypeProperty . ?rstr owl:someValuesFrom|owl:allValuesFrom|owl:onDataRange ?y
+                            }}
+                            UNION
+                            {{ 
+                                ?rstr owl:someValuesFrom|owl:allValuesFrom|owl:onDataRange ?y FILTER(STRSTARTS(STR(?y), "http://www.w3.org/2001/XMLSchema#"))
+                            }}
+                            UNION # no class qualification
+                            {{
+                                ?rstr owl:cardinality|owl:maxCardinality|owl:minCardinality ?card. ?p rdf:type owl:DatatypeProperty .  BIND("owl:Thing" AS ?y)
+                            }}
+                    }}
+        """ 
+        qres = self.ontology.query(q)
+        for r in qres:
+            if (r.x, RDFS.subClassOf, r.rstr) not in self.suppressed:
+                if r.x not in nodeLabels : 
+                    nodeLabels[r.x] = DotNode(classname=self.makelabel(r.x))
+                    visibleNodes.add(r.x)
+                dotnode = nodeLabels[r.x]
+                name = dotnode.classname
+                #del if name[-1] != '}' : name = '{' + name + '|}'
+                dotnode.attributes.append(suffix(r.p) + ': ' + suffix(r.y))
+                restrictionOnDatatype.add(r.rstr)
+        return restrictionOnDatatype
+
+    def genDomRng(self, nodeLabels : dict[Node, DotNode], visibleNodes: set[Node]):
+        """
+        Property with domain and/or range representation
+
+        """
+        self.view.comment('Domains and Ranges')
+        qdomrng = f"""
+                    SELECT DISTINCT ?dom ?rng 
+                        #(GROUP_CONCAT(REPLACE(REPLACE(STR(?p), ".*/", ""), ".*#", "") ; separator="<br/>") AS ?props)
+                        (GROUP_CONCAT(STR(?p) ; separator="<br/>") AS ?props)
+                    WHERE {{ ?p rdf:type owl:ObjectProperty .
+                        OPTIONAL {{
+                            ?p rdfs:domain ?dom
                         }}
-                        UNION # no class qualification
-                        {{
-                            ?rstr owl:cardinality|owl:maxCardinality|owl:minCardinality ?card. ?p rdf:type owl:DatatypeProperty .  BIND("owl:Thing" AS ?y)
+                        OPTIONAL {{
+                            ?p rdfs:range ?rng
                         }}
-                }}
-    """ 
-    qres = g.query(q)
-    for r in qres:
-        print(f"""// subclass of restriction on datatype {r.x} {r.p} {r.y}""")
-        if True: #r.x in objRestrArg or r.x in andOrNotArg or r.x in subc or r.x in eqc:
-            if r.x not in nodeLabels : 
-                nodeLabels[r.x] = DotNode(classname=makelabel(g, r.x))
-                visibleNodes.add(r.x)
-            dotnode = nodeLabels[r.x]
-            name = dotnode.classname
-            #del if name[-1] != '}' : name = '{' + name + '|}'
-            dotnode.attributes += suffix(r.p) + ': ' + suffix(r.y) + '\\l' 
-            restrictionOnDatatype.add(r.rstr)
-    return restrictionOnDatatype
-
-def genDomRng(g: Graph, nodeLabels : dict[Node, DotNode], visibleNodes: set[Node]):
-    """
-    Property with domain and/or range representation
-
-    """
-    print("""
-    
-    /// Domains and Ranges
-    
-    """)
-    qdomrng = f"""
-                SELECT DISTINCT ?dom ?rng 
-                    #(GROUP_CONCAT(REPLACE(REPLACE(STR(?p), ".*/", ""), ".*#", "") ; separator="<br/>") AS ?props)
-                    (GROUP_CONCAT(STR(?p) ; separator="<br/>") AS ?props)
-                WHERE {{ ?p rdf:type owl:ObjectProperty .
-                    OPTIONAL {{
-                        ?p rdfs:domain ?dom
                     }}
-                    OPTIONAL {{
-                        ?p rdfs:range ?rng
-                    }}
-                }}
-                GROUP BY ?dom ?rng
-                """
-    qres = g.query(qdomrng)
-    nid = 0
-    for r in qres :
-        if r.dom != None or r.rng != None :
-            if r.dom == None or r.rng == None :
-                nodeid = "https://white-placeholder/"+str(nid)
-                nid += 1
-                nodeLabels[nodeid] = DotNode(classname="*")
-                visibleNodes.add(nodeid)
-            else:
-                nodeid = None # never used
-            source = r.dom if r.dom != None else nodeid
-            target = r.rng if r.rng != None else nodeid
-            if r.dom != None : 
-                if r.dom not in nodeLabels : nodeLabels[r.dom] = DotNode(classname=makelabel(g, r.dom))
-                visibleNodes.add(r.dom)
-            if r.rng != None :
-                if r.rng not in nodeLabels : nodeLabels[r.rng] = DotNode(classname=makelabel(g, r.rng))
-                visibleNodes.add(r.rng)
-            proplabels = "<br/>".join(list(map(lambda x : makelabel(g, URIRef(x)), r.props.split('<br/>'))))
-            if source == target: # loop
-                print(f'  "{source}":n -> "{target}":s [  color="{DOM_RNG_LINK_COLOR}", label=<<b>{proplabels}</b>>]')      #{makelabel(g, r.p)}"]; ')
-            else:
-                print(f'  "{source}" -> "{target}" [  color="{DOM_RNG_LINK_COLOR}", label=<<b>{proplabels}</b>>]; ')
+                    GROUP BY ?dom ?rng
+                    """
+        qres = self.ontology.query(qdomrng)
+        nid = 0
+        for r in qres :
+            if r.dom != None or r.rng != None :
+                if r.dom == None or r.rng == None :
+                    nodeid = "https://white-placeholder/"+str(nid)
+                    nid += 1
+                    nodeLabels[nodeid] = DotNode(classname="*")
+                    visibleNodes.add(nodeid)
+                else:
+                    nodeid = None # never used
+                source = r.dom if r.dom != None else nodeid
+                target = r.rng if r.rng != None else nodeid
+                if r.dom != None : 
+                    if r.dom not in nodeLabels : nodeLabels[r.dom] = DotNode(classname=self.makelabel(r.dom))
+                    visibleNodes.add(r.dom)
+                if r.rng != None :
+                    if r.rng not in nodeLabels : nodeLabels[r.rng] = DotNode(classname=self.makelabel(r.rng))
+                    visibleNodes.add(r.rng)
+                proplabels = "<br/>".join(list(map(lambda x : self.makelabel(URIRef(x)), r.props.split('<br/>'))))
+                if source == target: # loop
+                    self.view.edge(source, target, f'<b>{proplabels}</b>', html=True,
+                              attrs={'color': self.colors.domRng, 'tailport': 'n', 'headport': 's'})
+                else:
+                    self.view.edge(source, target, f'<b>{proplabels}</b>', html=True, attrs={'color': self.colors.domRng})
 
   
 
-def genAndOr(g: Graph, nodeLabels : dict[Node, DotNode], visibleNodes: set[Node], opShortcuts: set[Node]) -> tuple[set[Node], set[Node]]:
-    andornot = set()
-    andornotarg = set()
-    for op in ["owl:unionOf", "owl:intersectionOf"]:
-        q_and_or_classes = f"""
-                    SELECT DISTINCT ?x  
-                    WHERE {{ ?x {op} ?y
-                    }}
-        """
-        qres = g.query(q_and_or_classes)
-        for r in qres:
-            if op == "owl:unionOf":
-                name = "OR"
-            else:
-                name = "AND"
-            nodeLabels[r.x] = DotNode(classname=name, isAndOrNot=True)
-            andornot.add(r.x)
-            visibleNodes.add(r.x)
+    def genAndOr(self, nodeLabels : dict[Node, DotNode], visibleNodes: set[Node], opShortcuts: set[Node]) -> tuple[set[Node], set[Node]]:
+        andornot = set()
+        andornotarg = set()
+        for op in ["owl:unionOf", "owl:intersectionOf"]:
+            q_and_or_classes = f"""
+                        SELECT DISTINCT ?x  
+                        WHERE {{ ?x {op} ?y
+                        }}
+            """
+            qres = self.ontology.query(q_and_or_classes)
+            for r in qres:
+                if op == "owl:unionOf":
+                    name = "OR"
+                else:
+                    name = "AND"
+                nodeLabels[r.x] = DotNode(classname=name, isAndOrNot=True)
+                andornot.add(r.x)
+                visibleNodes.add(r.x)
         
-            print(f"""   "{r.x}" [label="{name}", shape="rectangle", height="0", style="rounded", margin="0.02,0.02", color="black"] ;""")
-    # arguments
-    qa = f"""
-                SELECT DISTINCT ?x ?c
-                WHERE {{?x (owl:unionOf|owl:intersectionOf)/rdf:rest*/rdf:first ?c
-                    # FILTER NOT EXISTS{{?c rdf:type owl:Restriction}} 
-                }}
+                self.view.node(r.x, name, shape='rectangle',
+                          attrs={'height': '0', 'style': 'rounded', 'margin': '0.02,0.02', 'color': 'black'})
+        # arguments
+        qa = f"""
+                    SELECT DISTINCT ?x ?c
+                    WHERE {{?x (owl:unionOf|owl:intersectionOf)/rdf:rest*/rdf:first ?c
+                        # FILTER NOT EXISTS{{?c rdf:type owl:Restriction}} 
+                    }}
+                """
+        qares = self.ontology.query(qa)
+        for ra in qares:
+                if (ra.x, ra.c) not in opShortcuts:
+                    self.view.edge(ra.x, ra.c, attrs={'color': self.colors.arg})
+                    andornot.add(ra.x)
+                    andornotarg.add(ra.c)
+                    visibleNodes.add(ra.c)
+        return (andornot, andornotarg)
+
+    def genNot(self, nodeLabels : dict[Node, DotNode], visibleNodes: set[Node]):
+        q = f"""
+             SELECT DISTINCT ?cc ?c
+             WHERE {{ ?cc owl:complementOf ?c
+                   }}
             """
-    qares = g.query(qa)
-    for ra in qares:
-            if (ra.x, ra.c) not in opShortcuts:
-                print(f"""   "{ra.x}" -> "{ra.c}" [ color="{ARG_LINK_COLOR}"]""")
-                andornot.add(ra.x)
-                andornotarg.add(ra.c)
-                visibleNodes.add(ra.c)
-    return (andornot, andornotarg)
-
-def genNot(g: Graph, nodeLabels : dict[Node, DotNode], visibleNodes: set[Node]):
-    q = f"""
-         SELECT DISTINCT ?cc ?c
-         WHERE {{ ?cc owl:complementOf ?c
-               }}
-        """
-    qres = g.query(q)
-    for r in qres:
-        nodeLabels[r.cc] = DotNode(classname='NOT', isAndOrNot=True)
-        visibleNodes.add(r.cc)
-        visibleNodes.add(r.c)
-        print(f"""   "{r.cc}" [label="NOT", shape="rectangle", color="green"] ;""")
-        print(f"""   "{r.cc}" -> "{r.c}" [color="black"] ;""")
+        qres = self.ontology.query(q)
+        for r in qres:
+            nodeLabels[r.cc] = DotNode(classname='NOT', isAndOrNot=True)
+            visibleNodes.add(r.cc)
+            visibleNodes.add(r.c)
+            self.view.node(r.cc, 'NOT', shape='rectangle', attrs={'color': 'green'})
+            self.view.edge(r.cc, r.c, attrs={'color': 'black'})
 
 
-def genSub(g: Graph, restrOnDtype: set[Node], visibleNodes: set[Node]):
-    """
-    Show subclass as edges
-    """
-    print("""
-    
-    /// Subclasses
-    
-    """)
-    showSubclasses = False
+    def genSub(self, restrOnDtype: set[Node], visibleNodes: set[Node]):
+        """
+        Show subclass as edges
+        """
+        self.view.comment('Subclasses')
+        showSubclasses = False
 
-    subc = set()
+        subc = set()
     
-    qref =  f"""
-                SELECT DISTINCT ?x ?y 
-                WHERE {{ ?x rdfs:subClassOf ?y 
-                }}
-                """
-    qrefres = g.query(qref)
-
-    for r in qrefres:
-        if r.y not in restrOnDtype:
-            print(f'  "{r.x}" -> "{r.y}" [ arrowhead="onormal", color="{SUBCLASS_LINK_COLOR}"]; ')
-            subc.add(r.x)
-            subc.add(r.y)
-            visibleNodes.add(r.x)
-            visibleNodes.add(r.y)
-    return subc
-
-
-def genEquiv(g: Graph, visibleNodes: set[Node]):
-    # Equivalent Classes
-
-    eqc = set()
-    qref =  f"""
-                SELECT DISTINCT ?x ?y 
-                WHERE {{ ?x owl:equivalentClass ?y 
-                }}
-                """
-    qrefres = g.query(qref)
+        qref =  f"""
+                    SELECT DISTINCT ?x ?y 
+                    WHERE {{ ?x rdfs:subClassOf ?y 
+                    }}
+                    """
+        qrefres = self.ontology.query(qref)
+
+        for r in qrefres:
+            if r.y not in restrOnDtype and (r.x, RDFS.subClassOf, r.y) not in self.suppressed:
+                self.view.edge(r.x, r.y, attrs={'arrowhead': 'onormal', 'color': self.colors.subclass})
+                subc.add(r.x)
+                subc.add(r.y)
+                visibleNodes.add(r.x)
+                visibleNodes.add(r.y)
+        return subc
 
-    for r in qrefres:
-            print(f'  "{r.x}" -> "{r.y}" [ dir="both", color="black:black", arrowhead="onormal", arrowtail="onormal"]; ')
-            eqc.add(r.x)
-            eqc.add(r.y)
-            visibleNodes.add(r.x)
-            visibleNodes.add(r.y)
-    return eqc
 
-def addUpperLevel(g: Graph, subOfRestr: set[tuple[Node,Node]], visibleNodes: set[Node]):
-    """
-    Show the superclasses of all the visible classes
-    """
-    newVisible = set()
-    newSubEdge = set()
-    print("// Upper level Subc")
-    for v in visibleNodes:
-        qup = f"""
-                SELECT DISTINCT ?x ?y
-                WHERE {{ <{v}> rdfs:subClassOf* ?x. ?x rdfs:subClassOf ?y
-                    FILTER NOT EXISTS{{?y rdf:type owl:Restriction }}
-                }}
-              """
-        qres = g.query(qup)
-        for r in qres:
-            ##print(f"// {r.x} {r.y}")
-            if  (r.x, r.y) not in newSubEdge and (r.x, r.y) not in subOfRestr : # and r.x not in visibleNodes and r.y not in visibleNodes  :
-                print(f'  "{r.x}" -> "{r.y}" [ arrowhead="onormal", color="orange"]; ')
-                newSubEdge.add((r.x, r.y))
-                newVisible.add(r.x)
-                newVisible.add(r.y)
-    visibleNodes.update(newVisible)
-    print("// End upper level")
-
-def genAnnotations(g: Graph, nodeLabels : dict[Node, DotNode], visibleNodes: set[Node]):
-    print('''
-    
-    // Annotations
-    
-    ''')
-    qa =  f"""
-                SELECT DISTINCT ?x ?a (GROUP_CONCAT(STR(?y) ; separator="\\\\l - ") AS ?vals) 
-                WHERE {{ ?a a owl:AnnotationProperty .
-                         ?x ?a ?y 
-                }}
-                GROUP BY ?x ?a
-                """
-    qres = g.query(qa)
-
-    withLabels = set()
-    for r in qres:
-        targetid = str(r.x) + '-' + str(r.a)
-        property = makelabel(g, r.a)
-        if r.x not in nodeLabels:
-            nodeLabels[r.x] = DotNode(classname=makelabel(g, r.x))
-        value = r.vals
-        if 'label' in property.lower() or 'term' in property.lower():
-            nodeLabels[r.x].annotations += property + ":\\l\ - <B>" + r.vals + "</B>\\l"
-        else:
-            print(f'  "{r.x}" -> "{targetid}" [ label="{property}" color="orange"]; ')
-            visibleNodes.add(targetid)
-            nodeLabels[targetid] = DotNode(classname=r.vals, isAnnotVal=True)
+    def genEquiv(self, visibleNodes: set[Node]):
+        # Equivalent Classes
 
+        eqc = set()
+        qref =  f"""
+                    SELECT DISTINCT ?x ?y 
+                    WHERE {{ ?x owl:equivalentClass ?y 
+                    }}
+                    """
+        qrefres = self.ontology.query(qref)
 
+        for r in qrefres:
+                self.view.edge(r.x, r.y, attrs={'dir': 'both', 'color': 'black:black', 'arrowhead': 'onormal', 'arrowtail': 'onormal'})
+                eqc.add(r.x)
+                eqc.add(r.y)
+                visibleNodes.add(r.x)
+                visibleNodes.add(r.y)
+        return eqc
 
-print('digraph {')
-print('  rankdir="BT"')
+    def addUpperLevel(self, subOfRestr: set[tuple[Node,Node]], visibleNodes: set[Node]):
+        """
+        Show the superclasses of all the visible classes (the subclass edges that are not
+        already drawn or suppressed)
+        """
+        newVisible = set()
+        drawn = {(e.source, e.target) for e in self.view.edges()}
+        self.view.comment('Upper level Subc')
+        for (x, y) in superclassEdges(self.ontology.whole().g, visibleNodes):
+            if (x, y) not in subOfRestr and (str(x), str(y)) not in drawn \
+                    and (x, RDFS.subClassOf, y) not in self.suppressed:
+                drawn.add((str(x), str(y)))
+                self.view.edge(x, y, attrs={'arrowhead': 'onormal', 'color': self.colors.subclass})
+                newVisible.add(x)
+                newVisible.add(y)
+        visibleNodes.update(newVisible)
+        self.view.comment('End upper level')
+
+    def genAnnotations(self, nodeLabels : dict[Node, DotNode], visibleNodes: set[Node]):
+        """
+        Show the annotations of the visible classes: the label-like ones (label, term...)
+        as lines of the class node, the other ones as a node linked to the class
+        """
+        self.view.comment('Annotations')
+        index = self.ontology.whole().annotationIndex()
+        include = None if self.options.annotInclude is None else \
+            {resolve_name(self.g, p) for p in self.options.annotInclude}
+        exclude = {resolve_name(self.g, p) for p in self.options.annotExclude}
+
+        for x in [n for n in visibleNodes if isinstance(n, URIRef)]:
+            for a, texts in index.annotations(x, self.options.languages, include, exclude,
+                                              self.options.annotValues, self.options.annotChars):
+                targetid = str(x) + '-' + str(a)
+                property = self.makelabel(a)
+                if x not in nodeLabels:
+                    nodeLabels[x] = DotNode(classname=self.makelabel(x))
+                if 'label' in property.lower() or 'term' in property.lower():
+                    nodeLabels[x].annotations.append(property + ":")
+                    nodeLabels[x].annotations.extend(" - <B>" + escape(t) + "</B>" for t in texts)
+                else:
+                    self.view.edge(x, targetid, property, attrs={'color': 'orange'})
+                    visibleNodes.add(targetid)
+                    nodeLabels[targetid] = DotNode(classname='\\l - '.join(texts), isAnnotVal=True)
 
-dotnodelabel: dict[Node, DotNode] = {}   ## node IRI to dot node name
-visibleNodes = set()
+    def build(self) -> GraphView:
+        self.genView()
+        return self.view
 
-(objRest, objRestrArg, subToRestr) = genObjRestr(g, dotnodelabel, visibleNodes)
-subRestr = {x for pair in subToRestr for x in pair}
+    def genView(self):
+        dotnodelabel: dict[Node, DotNode] = {}   ## node IRI to dot node name
+        visibleNodes = set()
 
-dtypeRest = genDatatypeRestr(g, dotnodelabel, visibleNodes)
+        with profiler.phase('genObjRestr'):
+            (objRest, objRestrArg, subToRestr) = self.genObjRestr(dotnodelabel, visibleNodes)
+        subRestr = {x for pair in subToRestr for x in pair}
 
-genDomRng(g, dotnodelabel, visibleNodes)
+        with profiler.phase('genDatatypeRestr'):
+            dtypeRest = self.genDatatypeRestr(dotnodelabel, visibleNodes)
 
-(andOrNot, andOrNotArg) = genAndOr(g, dotnodelabel, visibleNodes, subToRestr)
+        with profiler.phase('genDomRng'):
+            self.genDomRng(dotnodelabel, visibleNodes)
 
-genNot(g, dotnodelabel, visibleNodes)
+        with profiler.phase('genAndOr'):
+            (andOrNot, andOrNotArg) = self.genAndOr(dotnodelabel, visibleNodes, subToRestr)
 
-subc = genSub(g, dtypeRest, visibleNodes)
+        with profiler.phase('genNot'):
+            self.genNot(dotnodelabel, visibleNodes)
 
-eqc = genEquiv(g, visibleNodes)
+        with profiler.phase('genSub'):
+            subc = self.genSub(dtypeRest, visibleNodes)
 
-if annot_flag : 
-    genAnnotations(g, dotnodelabel, visibleNodes)
+        with profiler.phase('genEquiv'):
+            eqc = self.genEquiv(visibleNodes)
 
-### addUpperLevel(g, subToRestr, visibleNodes)
+        if self.options.upper :
+            with profiler.phase('addUpperLevel'):
+                self.addUpperLevel(subToRestr, visibleNodes)
 
-#for x in eqc.union(subc.union(andOrNotArg.union(objRestrArg.union(subRestr)))):
-for x in visibleNodes:
-    if x not in dotnodelabel : dotnodelabel[x] = DotNode(classname=makelabel(g, x))
+        # after the upper level: the classes it adds are visible too
+        if self.options.annot :
+            with profiler.phase('genAnnotations'):
+                self.genAnnotations(dotnodelabel, visibleNodes)
 
-##### Add the labels
+        #for x in eqc.union(subc.union(andOrNotArg.union(objRestrArg.union(subRestr)))):
+        with profiler.phase('labels'):
+            for x in visibleNodes:
+                if x not in dotnodelabel : dotnodelabel[x] = DotNode(classname=self.makelabel(x))
 
-print("""
+            ##### Add the labels
 
-// Labels
+            self.view.comment('Labels')
 
-""")
-for nid in visibleNodes: # dotnodelabel:
-    n = dotnodelabel[nid]
-    if  n.isPropRestr:
-        print(f"""   "{nid}" [shape="rectangle", height="0", label=" "] ;""")
-    elif n.isAnnotVal:
-        print(f"""   "{nid}" [shape="rectangle", color="green", label="{n.classname}"] ;""")
-    elif n.isAndOrNot:
-        pass
+            for nid in visibleNodes: # dotnodelabel:
+                n = dotnodelabel[nid]
+                if  n.isPropRestr:
+                    self.view.node(nid, ' ', shape='rectangle', attrs={'height': '0'})
+                elif n.isAnnotVal:
+                    self.view.node(nid, n.classname, shape='rectangle', attrs={'color': 'green'})
+                elif n.isAndOrNot:
+                    pass
+                else:
+                    if n.classname == '*':
+                        cls_display = '<i>Thing</i>'
+                    else: 
+                        cls_display = f'<b>{n.classname}</b>'
+                    module = self.ontology.moduleOf.get(nid) if self.options.modules else None
+                    if module is not None: self.view.cluster(module, module)
+                    self.view.node(nid, cls_display, sections=[n.annotations, n.attributes], shape='table', html=True,
+                                   cluster=module)
+
+
+def runBatch(ontology: OntologyView, batchFile: str, renders: list = (), jobs: int = 4):
+    """ render and write each view of the batch file (see BATCH) in a pool of jobs threads
+    that share the ontology, and run dot on their .dot outputs for each format of renders
+    """
+    with open(batchFile) as f:
+        batch = json.load(f)
+    def run(no: int, config: dict):
+        args = list(config.get('options', []))
+        if 'format' in config: args.append('--format=' + config['format'])
+        args.append('--output=' + config.get('output', f'view-{no}'))
+        formats, output = output_options(args)
+        view = ontology.render(ViewOptions.fromArgs(args))
+        with profiler.phase('write'):
+            write_view(view, formats, output)
+        for fmt in renders:
+            renderDot(output_paths(formats, output), fmt)
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        list(executor.map(run, range(1, len(batch) + 1), batch))
+
+
+def renderDot(paths: dict, fmt: str):
+    """ run Graphviz dot on the .dot output of paths (--render=fmt) """
+    if 'dot' not in paths: return
+    target = re.sub(r'\.dot$', '', paths['dot']) + '.' + fmt
+    try:
+        subprocess.run(['dot', '-T' + fmt, '-o', target, paths['dot']], check=True)
+    except (OSError, subprocess.CalledProcessError) as e:
+        print(f'// WARNING // dot -T{fmt} failed: {e}', file=sys.stderr)
+
+
+def writeAll(ontology: OntologyView, argv: list):
+    """ write the views of the command line: the batch files or the single view """
+    renders = [arg[len('--render='):] for arg in argv if arg.startswith('--render=')]
+    batchFiles = [arg[len('--batch='):] for arg in argv if arg.startswith('--batch=')]
+    if batchFiles:
+        for batchFile in batchFiles:
+            runBatch(ontology, batchFile, renders, imports_options(argv)[2])
     else:
-        if n.classname == '*':
-            cls_display = '<i>Thing</i>'
-        else: 
-            cls_display = f'<b>{n.classname}</b>'
-        lab = f"""<table BORDER="0" CELLBORDER="1" CELLSPACING="0" ><tr><td>{cls_display}</td></tr>"""
-        if n.annotations != '':
-            lab += f"""<tr><td align="left">{n.annotations}</td></tr>"""
-        if n.attributes != '':
-            lab += f"""<tr><td align="left">{n.attributes}</td></tr>"""
-        lab = lab.replace('\l','<BR ALIGN="LEFT"/>')
-        lab = lab.replace('\\','')
-        lab += "</table>"
-        print(f"""   "{nid}" [shape="none", margin="0.05,0.02", label=<{lab}>] ;""")
-
-
-print('}')
+        formats, output = output_options(argv)
+        view = ontology.render(ViewOptions.fromArgs(argv))
+        with profiler.phase('write'):
+            write_view(view, formats, output)
+        for fmt in renders:
+            renderDot(output_paths(formats, output), fmt)
+
+
+def fileStamps(files: list) -> list:
+    """ the modification time and size of the files (None for a missing file) """
+    stamps = []
+    for path in files:
+        try:
+            st = os.stat(path)
+            stamps.append((st.st_mtime_ns, st.st_size))
+        except OSError:
+            stamps.append(None)
+    return stamps
+
+
+def watch(ontology: OntologyView, argv: list, interval: float = 0.3):
+    """ write the views again each time the files of the ontology change (--watch) """
+    stamps = fileStamps(ontology.files)
+    while True:
+        time.sleep(interval)
+        current = fileStamps(ontology.files)
+        if current == stamps or None in current: continue     # None: the file is being saved
+        stamps = current
+        start = time.perf_counter()
+        try:
+            changed = ontology.reload()
+            writeAll(ontology, argv)
+        except Exception as e:      # e.g. a syntax error in the file being edited: wait for the next save
+            print(f'// ERROR // {e}', file=sys.stderr)
+            continue
+        stamps = fileStamps(ontology.files)     # the imports may have changed
+        print(f'// updated in {time.perf_counter() - start:.2f} s ({changed} changed descriptions)', file=sys.stderr)
+
+
+def main(argv: list):
+    profile_option(argv)
+    catalogs, cache, jobs = imports_options(argv)
+    ontology = OntologyView(argv[1], '--imports' in argv, catalogs, cache, jobs)
+    try:
+        if '--watch' in argv and not any(arg.startswith(('--output=', '--batch=')) for arg in argv):
+            raise ValueError('--watch needs --output (or --batch)')
+        writeAll(ontology, argv)
+    except ValueError as e:
+        print(f'// ERROR // {e}', file=sys.stderr)
+        sys.exit(1)
+    if '--watch' in argv:
+        try:
+            watch(ontology, argv)
+        except KeyboardInterrupt:
+            pass
+    profiler.report()
+
+
+if __name__ == "__main__":
+    main(sys.argv)
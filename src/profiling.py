@@ -0,0 +1,160 @@
+""" Profiling of the phases and queries of owl2dot and rdf-viz (--profile)
+
+The tools run their phases in profiler.phase(name) blocks and their queries through
+profiler.query() (rdflib graphs) or profiler.record_query() (SPARQL endpoints). When the
+profiler is enabled, report() writes on stderr a JSON object with
+
+    phases    for each phase (in the order in which they ran): elapsed time (s), number
+              of queries and of rows they returned, counters (e.g. label lookups), peak
+              Python memory allocated during the phase (MB)
+    queries   for each query: phase, hash of the SPARQL text, elapsed time, rows returned
+    counters  the counters summed over the run
+    items     per item breakdowns, e.g. rdf-viz's per class time and sizes
+    total     elapsed time, peak Python memory and peak RSS of the process (MB)
+
+Each thread has its own stack of phases (rdf-viz summarizes its sources in threads); the
+peak memory of phases that run at the same time is that of the whole process.
+
+When it is disabled (the default), phase() and query() add nothing but a function call.
+"""
+
+from contextlib import contextmanager
+
+import hashlib
+import json
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+
+MB = 1024 * 1024
+
+
+def query_hash(text: str) -> str:
+    """ short hash of a SPARQL text, the same for the same query in every run """
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:12]
+
+
+class Profiler:
+
+    def __init__(self):
+        self.enabled = False
+        self.start = 0.0
+        self.phases = []        # phases, in the order in which they started
+        self.local = threading.local()      # stack of the running phases of each thread
+        self.queries = []
+        self.counters = {}
+        self.items = {}         # kind -> key -> {measure: value}
+        self.lock = threading.Lock()
+
+    @property
+    def stack(self) -> list:
+        if not hasattr(self.local, 'stack'):
+            self.local.stack = []
+        return self.local.stack
+
+    def enable(self):
+        self.enabled = True
+        self.start = time.perf_counter()
+        tracemalloc.start()
+
+    @contextmanager
+    def phase(self, name: str):
+        if not self.enabled:
+            yield
+            return
+        record = {'name': name, 'time': 0.0, 'queries': 0, 'rows': 0, 'counters': {}, 'peak_memory': 0}
+        self.phases.append(record)
+        if self.stack:      # the peak of the enclosing phase before it is reset
+            self.stack[-1]['peak_memory'] = max(self.stack[-1]['peak_memory'], tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+        self.stack.append(record)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            record['time'] = round(time.perf_counter() - start, 6)
+            record['peak_memory'] = max(record['peak_memory'], tracemalloc.get_traced_memory()[1])
+            self.stack.pop()
+            if self.stack:
+                self.stack[-1]['peak_memory'] = max(self.stack[-1]['peak_memory'], record['peak_memory'])
+
+    def query(self, graph, text: str, **kwargs):
+        """ the result of graph.query(text); when profiling, the rows are read at once
+        (in a list) so that the time of the query includes the time of its evaluation
+        """
+        if not self.enabled:
+            return graph.query(text, **kwargs)
+        start = time.perf_counter()
+        rows = list(graph.query(text, **kwargs))
+        self.record_query(text, time.perf_counter() - start, len(rows))
+        return rows
+
+    def record_query(self, text: str, elapsed: float, rows: int):
+        if not self.enabled: return
+        with self.lock:
+            phase = self.stack[-1] if self.stack else None
+            self.queries.append({'phase': phase['name'] if phase else None, 'hash': query_hash(text),
+                                 'time': round(elapsed, 6), 'rows': rows})
+            for record in self.stack:
+                record['queries'] += 1
+                record['rows'] += rows
+
+    def count(self, name: str, n: int = 1):
+        if not self.enabled: return
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+            for record in self.stack:
+                record['counters'][name] = record['counters'].get(name, 0) + n
+
+    @contextmanager
+    def item(self, kind: str, key: str):
+        """ add the time (and queries) of the block to the measures of the item key of kind """
+        if not self.enabled:
+            yield
+            return
+        nb_queries = len(self.queries)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self.lock:
+                measures = self.items.setdefault(kind, {}).setdefault(str(key), {})
+                measures['time'] = round(measures.get('time', 0.0) + elapsed, 6)
+                queries = len(self.queries) - nb_queries
+                if queries: measures['queries'] = measures.get('queries', 0) + queries
+
+    def annotate(self, kind: str, key: str, **measures):
+        """ set measures (e.g. sizes) of the item key of kind """
+        if not self.enabled: return
+        with self.lock:
+            self.items.setdefault(kind, {}).setdefault(str(key), {}).update(measures)
+
+    def report(self, out=None):
+        if not self.enabled: return
+        peak = max([tracemalloc.get_traced_memory()[1]] + [record['peak_memory'] for record in self.phases])
+        for record in self.phases:
+            record['peak_memory'] = round(record['peak_memory'] / MB, 3)
+        items = {kind: dict(sorted(values.items(), key=lambda kv: -kv[1].get('time', 0)))
+                 for kind, values in self.items.items()}
+        report = {'phases': self.phases,
+                  'queries': self.queries,
+                  'counters': self.counters,
+                  'items': items,
+                  'total': {'time': round(time.perf_counter() - self.start, 6),
+                            'peak_memory': round(peak / MB, 3),
+                            'max_rss': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)}}
+        out = out or sys.stderr
+        json.dump(report, out, indent=1)
+        out.write('\n')
+
+
+profiler = Profiler()
+
+
+def profile_option(argv: list):
+    """ enable the profiler if --profile is on the command line """
+    if '--profile' in argv:
+        profiler.enable()
@@ -9,14 +9,95 @@
 
 Use:
 
-% python3 path-to-rdf-viz.py graph-location prefix-file
+% python3 path-to-rdf-viz.py graph-location... [prefix-file.json] [options]
 
 where 
 
 graph-location is either the name of a file that contains and RDF graph
 or the URL of an RDF graph stored at a SPARQL endpoint, e.g. http://localhost:7200/repositories/fds
+(the endpoint is queried directly, with a few aggregate queries; test/sparql-endpoint.py
+serves a local file as a stand-in endpoint)
 
-output the .dot representation on the standard output
+A graph-location that is a directory or a glob pattern (e.g. 'dump/*.nt') is read as a set of
+shards: the shards are summarized in parallel processes (--jobs) and their partial summaries
+merged; an instance may have its rdf:type triple in a different shard than its other triples.
+
+With several graph-locations, the sources are summarized concurrently and merged into
+one view; each class shows the numbers of the sources it occurs in.
+
+OPTIONS:
+
+    --stream   read the N-Triples or N-Quads files (.nt, .nq, possibly .gz) one line at a time
+               instead of loading them in memory. The triples must be grouped by subject (a
+               subject whose triples are not together is reported as an error).
+
+    --card     show the cardinality of the class links (e.g. 0..*, 1) computed from the
+               number of links of each instance
+
+    --penwidth scale the width of the class links by their number of triples
+
+    --index    build (once) an on-disk index of each graph file in file.idx/: numbered terms and
+               sorted SPO and POS arrays of term numbers, memory-mapped and scanned by the later
+               runs, which do not parse the file again (the index is rebuilt when the file changes)
+
+    --jobs=n   number of sources (or of shards) summarized at the same time (default: 4)
+
+    --state=file  incremental mode: the summary of the graph-locations (files) is saved in file.
+                  Without graph-locations, the summary saved in file is read, updated with
+                  the triples of the --remove=f and --add=f files (N-Triples to match blank
+                  nodes), saved again, and shown. --add and --remove can be repeated; with
+                  graph-locations, they are applied after the graph-locations are summarized.
+
+    --charsets  summarize the graph-locations (files, taken as one graph) by their characteristic
+                sets: the subjects that use the same set of properties form a node, whatever
+                their types. The sets of fewer than --min-support=n (default 10) subjects are
+                merged into their nearest frequent superset.
+
+    --collapse  show one node per namespace (e.g. p0:*) instead of one per class
+
+    --top=k     show only the k classes with the most instances and link triples; the other
+                classes are folded into one node per namespace
+
+    --max-nodes=n  fold the least important classes into namespace nodes so that the view has
+                   at most n class nodes (as many top classes as possible)
+
+    --max-edges=m  show only the m class links with the most triples
+
+    --clusters  draw the classes of each namespace in a cluster (subgraph cluster_*)
+
+    --timeout=s  time limit in seconds of each source (file, shards or endpoint): a source that
+                 is not summarized in time is reported as failed and left out. Its work is not
+                 stopped, and counts in the --jobs limit until it ends. It also limits each
+                 request to an endpoint
+
+    --retries=n  number of times a request to an endpoint that timed out is sent again (default: 0)
+
+    --page-size=n  read the results of the endpoint queries n rows at a time, and compute the
+                   instance prefixes from the instances of each class read n at a time
+
+    --sample=k   approximate mode: the attributes, links and instance prefixes of each class
+                 are inferred from k instances chosen by reservoir sampling. On endpoints the
+                 instances are drawn from --sample-blocks=m (default 100) random blocks of about
+                 100 type triples, a block being the instances whose IRI has a given hash prefix,
+                 and the class sizes are estimated with an error bound. The endpoint then counts
+                 and scans the type triples once each (without sorting them), and answers one
+                 query per 100 sampled instances. Not applied to --stream files.
+
+    --lang=xx,yy...  show the class label in the first of these languages that the class has
+                     (a label without language tag first); by default the last label read
+
+    --label-props=p1,p2...  other label properties of the classes (IRIs or prefixed names), used
+                            when a class has neither an rdfs:label nor a skos:prefLabel
+
+    --format=f1,f2...  output formats: dot (default), graphml, json, mermaid
+
+    --output=name  write the view in name (name.dot, name.json... with several formats)
+
+    --profile  write on stderr a JSON report of the time and peak memory of each phase (parse,
+               summarize, view...), of the endpoint queries, and, per class, of the time spent
+               on the class and its numbers of instances, attributes and link triples
+
+output the .dot representation (or the --format one) on the standard output
 
 TODO
 
@@ -27,10 +108,37 @@ TODO
 from rdflib import Graph, Literal, RDF, URIRef, BNode
 from rdflib import Namespace
 from rdflib.namespace import RDF, RDFS
+from rdflib.term import Node
+from rdflib.plugins.parsers.ntriples import W3CNTriplesParser, r_wspace
+from rdflib.query import Result
+from rdflib.util import from_n3
 
 import sys
 import re
 import json
+import gzip
+import sqlite3
+import math
+import random
+import time
+import pickle
+import os
+import glob
+import mmap
+import threading
+from array import array
+from io import BytesIO
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+from urllib.error import HTTPError, URLError
+from concurrent.futures import Future, ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from graphview import GraphView, output_options, write_view
+from profiling import profiler, profile_option
+from labels import LABEL_PROPERTIES, choose_label, language_option, label_properties, label_properties_option
+
+from dataclasses import dataclass, field
+from functools import lru_cache
 
 PREFIXES = """
 PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
@@ -55,204 +163,1657 @@ stdprefixes = set(['rdf','rdfs','dc','dct','owl','xsd','xml','skos'])
 
 additional_prefix_no = 0
 
-g = Graph()
+PREFIXIZE_CACHE_SIZE = 100000
+
+# lengths of the namespaces of invprefixes, longest first, for the longest-match lookup
+prefix_lengths = sorted({len(v) for v in invprefixes}, reverse=True)
 
-service = ''
+def add_prefix(namespace: str, prefix: str):
+    invprefixes[namespace] = prefix
+    if len(namespace) not in prefix_lengths:
+        prefix_lengths.append(len(namespace))
+        prefix_lengths.sort(reverse=True)
+    known_prefixize.cache_clear()
 
+@lru_cache(maxsize=PREFIXIZE_CACHE_SIZE)
+def known_prefixize(uri: str) -> str :
+    """ uri shortened with the longest matching namespace of invprefixes, or None """
+    for n in prefix_lengths:
+        if n <= len(uri):
+            pfx = invprefixes.get(uri[:n])
+            if pfx is not None:
+                return pfx + ':' + uri[n:]
+    return None
 
 def prefixize(uri:str) -> str :
     global additional_prefix_no
-    puri = uri
-    for v in invprefixes:
-        if uri.startswith(v) : return puri.replace(v, invprefixes[v]+':')
+    puri = known_prefixize(uri)
+    if puri is not None: return puri
 
     newprefix = "p"+str(additional_prefix_no)
     pfx = extractprefix(uri)
-    invprefixes[pfx] = newprefix
+    add_prefix(pfx, newprefix)
     additional_prefix_no += 1
-    return puri.replace(pfx, newprefix+':')
+    return newprefix + ':' + uri[len(pfx):]
 
+@lru_cache(maxsize=PREFIXIZE_CACHE_SIZE)
 def extractprefix(uri:str) -> str :
     if '#' in uri:
         return uri.split('#')[0] + '#'
     else:
         return re.sub('/[^/]+$','/', uri)
 
-def get_one_label(class_uri: str):
-    """ find one rdfs:label of class_uri 
+# the label properties of the classes, in order of preference (LABEL_PROPERTIES, then the
+# ones of --label-props): set by gen_dot_view, and in the shard processes
+label_props = list(LABEL_PROPERTIES)
+
+
+def first_labels(labels: dict) -> list:
+    """ the values of the first property of label_props that has values in labels
+    (property -> values), as labels.LabelIndex chooses the label of a resource
     """
-    qlab =  PREFIXES + f"""
-            SELECT ?lab
-            WHERE {{ 
-                {service}
-                {{ <{class_uri}> rdfs:label ?lab . }}
-            }}
-            """
-    qres = g.query(qlab)
-    label = ''
-    for r in qres:
-        print(f'// INFO // {r.lab}')
-        label = r.lab
-    return label
-
-def nb_instances(class_uri: str):
-    """ find the number of instances of class_uri 
+    for p in label_props:
+        if labels.get(p):
+            return list(labels[p])
+    return []
+
+
+@dataclass
+class ClassSummary:
+    labels: list = field(default_factory=list)      # the label values of the class (see first_labels)
+    attributes: list = field(default_factory=list)  # properties used with a literal value
+    nb_instances: int = 0
+    instances: list = field(default_factory=list)   # one (non blank) instance per namespace
+    sources: list = field(default_factory=list)     # numbers of the sources where the class occurs
+    error: float = 0.0                              # error bound of nb_instances (approximate mode)
+    sample: int = 0                                 # number of sampled instances (approximate mode)
+
+
+@dataclass
+class LinkStats:
+    triples: int = 0        # number of (s p o) triples that make the link
+    subjects: int = 0       # number of subjects that have the link
+    min_degree: int = 0     # smallest and largest number of links of such a subject
+    max_degree: int = 0
+
+    def add_subject(self, degree: int):
+        self.min_degree = degree if self.subjects == 0 else min(self.min_degree, degree)
+        self.max_degree = max(self.max_degree, degree)
+        self.subjects += 1
+        self.triples += degree
+
+    def merge(self, other: 'LinkStats'):
+        if other.subjects == 0: return
+        self.min_degree = other.min_degree if self.subjects == 0 else min(self.min_degree, other.min_degree)
+        self.max_degree = max(self.max_degree, other.max_degree)
+        self.subjects += other.subjects
+        self.triples += other.triples
+
+    def avg_degree(self) -> float:
+        return self.triples / self.subjects if self.subjects else 0.0
+
+    def cardinality(self, nb_sources: int) -> str:
+        """ UML-like cardinality of the link target, given the number of instances
+        of the source class (0 as lower bound when some instances lack the link)
+        """
+        low = 0 if self.subjects < nb_sources else self.min_degree
+        high = '*' if self.max_degree > 1 else str(self.max_degree)
+        return str(low) if str(low) == high else f'{low}..{high}'
+
+
+class SchemaSummary:
+    """ The implicit schema of a graph: its classes, its class links and, for each class,
+    a ClassSummary
+
+    links maps each (class, property, class) link to its LinkStats.
+    classes and links are in the order in which the SPARQL queries of the endpoint
+    mode return them on an rdflib graph, so that both modes produce the same view
     """
-    qinst = f"""
-            SELECT (COUNT(?i) as ?ci)
-            WHERE {{ 
-                {service}
-                {{ ?i rdf:type <{class_uri}>. }}
-            }}
-            """
-    qres = g.query(qinst)
-    nbi = 0
-    for r in qres:
-        nbi = r.ci
-    return f'Instances: {nbi} \\l'
-
-def find_instance_prefixes(class_uri: str):
-    """ find the prefixes of all the instances of class_uri 
+
+    def __init__(self, classes: list, links: dict, class_summaries: dict):
+        self.classes = classes
+        self.links = links
+        self.class_summaries = class_summaries
+
+    def class_summary(self, class_uri: Node) -> ClassSummary:
+        return self.class_summaries[class_uri]
+
+    def class_name(self, class_uri: Node) -> str:
+        """ the name of the class in the view """
+        return prefixize(class_uri)
+
+
+class SchemaSummarizer:
+    """ Builds a SchemaSummary in one pass over a stream of triples
+
+    Each triple is added with add(), in any order: the type of a resource may
+    come after its other triples. summary() then joins the per-resource data
+    (types, properties, linked resources) into per-class data.
+    """
+
+    def __init__(self):
+        self.instances = {}     # class -> instances, in the order of the type triples
+        self.class_rank = {}    # class -> rank of its first type triple
+        self.types = {}         # resource -> classes
+        self.type_rank = {}     # (resource, class) -> (rank of the class, rank of the resource in the class)
+        self.properties = {}    # subject -> {property: rank}
+        self.attributes = {}    # subject -> properties with a literal value
+        self.edges = {}         # subject -> {(property, resource): None}
+        self.labels = {}        # subject -> label property -> {label: None}
+
+    def add(self, s: Node, p: Node, o: Node):
+        properties = self.properties.setdefault(s, {})
+        if p not in properties:
+            properties[p] = len(properties)
+        if p == RDF.type:
+            self.add_type(s, o)
+        if p in label_props:
+            self.labels.setdefault(s, {}).setdefault(p, {})[o] = None
+        if isinstance(o, Literal):
+            self.attributes.setdefault(s, set()).add(p)
+        else:
+            self.edges.setdefault(s, {})[(p, o)] = None
+
+    def add_type(self, s: Node, c: Node):
+        """ records that s is an instance of c, without adding the triple (s rdf:type c)
+        to the properties and edges of s
+        """
+        if (s, c) in self.type_rank: return
+        if c not in self.instances:
+            self.class_rank[c] = len(self.instances)
+            self.instances[c] = []
+        instances = self.instances[c]
+        self.type_rank[(s, c)] = (self.class_rank[c], len(instances))
+        instances.append(s)
+        self.types.setdefault(s, []).append(c)
+
+    def links(self) -> dict:
+        """ the (class, property, class) links with their LinkStats, ordered by the
+        first (target type triple, source type triple, property) that produces them
+
+        The edges of each typed subject are hash-joined with the resource types.
+        """
+        first = {}
+        stats = {}
+        for s, edges in self.edges.items():
+            stypes = self.types.get(s)
+            if stypes is None: continue
+            prank = self.properties[s]
+            degrees = {}   # (property, target class) -> number of edges of s
+            for (p, o) in edges:
+                for z in self.types.get(o, ()):
+                    if isinstance(z, BNode): continue
+                    degrees[(p, z)] = degrees.get((p, z), 0) + 1
+                    zrank = self.type_rank[(o, z)]
+                    for x in stypes:
+                        key = (zrank, self.type_rank[(s, x)], prank[p])
+                        link = (x, p, z)
+                        if link not in first or key < first[link]:
+                            first[link] = key
+            for (p, z), degree in degrees.items():
+                for x in stypes:
+                    stats.setdefault((x, p, z), LinkStats()).add_subject(degree)
+        return {link: stats[link] for link in sorted(first, key=first.get)}
+
+    def class_summary(self, class_uri: Node) -> ClassSummary:
+        cs = ClassSummary(labels=first_labels(self.labels.get(class_uri, {})))
+        instances = self.instances[class_uri]
+        cs.nb_instances = len(instances)
+        attributes = {}
+        namespaces = {}
+        for i in instances:
+            literal_props = self.attributes.get(i)
+            if literal_props:
+                for p in self.properties[i]:
+                    if p in literal_props: attributes[p] = None
+            if not isinstance(i, BNode):
+                namespaces.setdefault(extractprefix(i), i)
+        cs.attributes = list(attributes)
+        cs.instances = list(namespaces.values())
+        return cs
+
+    def summary(self) -> SchemaSummary:
+        classes = [c for c in self.instances if not isinstance(c, BNode)]
+        summaries = {}
+        for c in classes:
+            with profiler.item('classes', c):
+                summaries[c] = self.class_summary(c)
+        with profiler.phase('links'):
+            links = self.links()
+        return SchemaSummary(classes, links, summaries)
+
+
+def graph_triples(graph: Graph):
+    """ the triples of graph that a SchemaSummarizer needs, following the order of
+    the graph indexes: the rdf:type triples, then the triples of the typed resources,
+    then the labels of the classes
+    """
+    typed = {}
+    for t in graph.triples((None, RDF.type, None)):
+        typed[t[0]] = None
+        yield t
+    for s in typed:
+        for p, o in graph.predicate_objects(s):
+            if p != RDF.type: yield (s, p, o)
+    for c in dict.fromkeys(graph.objects(None, RDF.type)):
+        if c not in typed:
+            for p in label_props:
+                for lab in graph.objects(c, p):
+                    yield (c, p, lab)
+
+
+def summarize(triples) -> SchemaSummary:
+    summarizer = SchemaSummarizer()
+    for (s, p, o) in triples:
+        summarizer.add(s, p, o)
+    return summarizer.summary()
+
+
+class _DocumentBNodeIds(dict):
+    """ bnode_context for the N-Triples parser that keeps the blank node labels of
+    the document, instead of remembering a fresh blank node for each of them
+    """
+    def get(self, key, default=None):
+        return key
+
+
+def ntriples_stream(path: str):
+    """ generate the triples of an N-Triples or N-Quads file (possibly gzipped),
+    one line at a time (the graph names of N-Quads are ignored)
+    """
+    parser = W3CNTriplesParser()
+    bnode_ids = _DocumentBNodeIds()
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            parser.line = line
+            parser.eat(r_wspace)
+            if not parser.line or parser.line.startswith('#'): continue
+            s = parser.subject(bnode_ids)
+            parser.eat(r_wspace)
+            p = parser.predicate()
+            parser.eat(r_wspace)
+            o = parser.object(bnode_ids)
+            yield (s, p, o)
+
+
+class StreamingSummarizer:
+    """ Builds a SchemaSummary from a stream of triples grouped by subject, as in
+    the N-Triples dumps of triple stores (otherwise sort the dump first)
+
+    Only the per-class aggregates and the triples of the current subject are kept
+    in memory. The types of the resources, the resource links and the labels, which
+    are needed at the end to compute the class links and the class labels, are
+    spilled to a temporary SQLite database.
+
+    The folded subjects are also spilled, with a unique key: a subject that comes back
+    after its triples were folded raises a ValueError instead of being counted twice.
+    """
+
+    BATCH_SIZE = 10000
+
+    def __init__(self):
+        self.db = sqlite3.connect('')  # temporary on-disk database
+        self.db.executescript("""
+            CREATE TABLE types(r TEXT, c INTEGER, crank INTEGER, pos INTEGER);
+            CREATE TABLE edges(s TEXT, p INTEGER, o TEXT, prank INTEGER);
+            CREATE TABLE labels(r TEXT, rank INTEGER, label TEXT);
+            CREATE TABLE subjects(r TEXT PRIMARY KEY) WITHOUT ROWID;
+        """)
+        self.terms = {}        # class or property -> id
+        self.term_list = []    # id -> class or property
+        self.class_rank = {}   # class -> rank
+        self.aggregates = {}   # class -> ClassSummary
+        self.attributes = {}   # class -> {property: None}
+        self.namespaces = {}   # class -> {namespace: first instance}
+        self.pending = {'types': [], 'edges': [], 'labels': [], 'subjects': []}
+        self.subject = None
+        self.group = []
+
+    def term_id(self, t: Node) -> int:
+        tid = self.terms.get(t)
+        if tid is None:
+            tid = self.terms[t] = len(self.term_list)
+            self.term_list.append(t)
+        return tid
+
+    def spill(self, table: str, row: tuple):
+        rows = self.pending[table]
+        rows.append(row)
+        if len(rows) >= self.BATCH_SIZE:
+            self.flush(table)
+
+    def flush(self, table: str):
+        rows = self.pending[table]
+        if rows:
+            before = self.db.total_changes
+            try:
+                self.db.executemany(f'INSERT INTO {table} VALUES ({",".join("?" * len(rows[0]))})', rows)
+            except sqlite3.IntegrityError:
+                # the rows before the failing one are inserted
+                subject = rows[self.db.total_changes - before][0]
+                raise ValueError(f'the triples of {subject} are not grouped by subject '
+                                 '(sort the file, e.g. with sort -u)') from None
+            rows.clear()
+
+    def add(self, s: Node, p: Node, o: Node):
+        if s != self.subject:
+            self.fold()
+            self.subject = s
+        self.group.append((p, o))
+
+    def fold(self):
+        """ add the triples of the current subject to the class aggregates """
+        s = self.subject
+        if s is None: return
+        types = {}
+        properties = {}
+        literal_props = set()
+        edges = {}
+        labels = {}
+        for (p, o) in self.group:
+            if p not in properties: properties[p] = len(properties)
+            if p == RDF.type: types[o] = None
+            if p in label_props: labels[(label_props.index(p), o.n3())] = None     # with its language
+            if isinstance(o, Literal):
+                literal_props.add(p)
+            else:
+                edges[(p, o)] = None
+        self.group = []
+
+        rid = s.n3()
+        self.spill('subjects', (rid,))
+        for rank, lab in labels:
+            self.spill('labels', (rid, rank, lab))
+        if not types: return
+        for c in types:
+            if c not in self.class_rank:
+                self.class_rank[c] = len(self.class_rank)
+                self.aggregates[c] = ClassSummary()
+                self.attributes[c] = {}
+                self.namespaces[c] = {}
+            cs = self.aggregates[c]
+            self.spill('types', (rid, self.term_id(c), self.class_rank[c], cs.nb_instances))
+            cs.nb_instances += 1
+            attributes = self.attributes[c]
+            for p in properties:
+                if p in literal_props: attributes[p] = None
+            if not isinstance(s, BNode):
+                self.namespaces[c].setdefault(extractprefix(s), s)
+        for (p, o) in edges:
+            self.spill('edges', (rid, self.term_id(p), o.n3(), properties[p]))
+
+    def links(self) -> dict:
+        """ the (class, property, class) links with their LinkStats, in the same order
+        as SchemaSummarizer.links
+        """
+        self.db.execute('CREATE INDEX types_r ON types(r)')
+        rows = self.db.execute("""
+            SELECT sx.c, e.p, oz.c FROM edges e
+                JOIN types sx ON sx.r = e.s
+                JOIN types oz ON oz.r = e.o
+            ORDER BY oz.crank, oz.pos, sx.crank, sx.pos, e.prank
+        """)
+        links = {}
+        for (x, p, z) in rows:
+            link = (self.term_list[x], self.term_list[p], self.term_list[z])
+            if not isinstance(link[2], BNode) and link not in links:
+                links[link] = LinkStats()
+        rows = self.db.execute("""
+            SELECT x, p, z, COUNT(*), SUM(d), MIN(d), MAX(d) FROM (
+                SELECT sx.c AS x, e.p AS p, oz.c AS z, COUNT(*) AS d FROM edges e
+                    JOIN types sx ON sx.r = e.s
+                    JOIN types oz ON oz.r = e.o
+                GROUP BY sx.c, e.p, oz.c, e.s)
+            GROUP BY x, p, z
+        """)
+        for (x, p, z, subjects, triples, min_degree, max_degree) in rows:
+            link = (self.term_list[x], self.term_list[p], self.term_list[z])
+            if link in links:
+                links[link] = LinkStats(triples, subjects, min_degree, max_degree)
+        return links
+
+    def summary(self) -> SchemaSummary:
+        self.fold()
+        self.subject = None
+        for table in self.pending:
+            self.flush(table)
+        classes = [c for c in self.aggregates if not isinstance(c, BNode)]
+        for c in classes:
+            with profiler.item('classes', c):
+                cs = self.aggregates[c]
+                cs.attributes = list(self.attributes[c])
+                cs.instances = list(self.namespaces[c].values())
+                rows = self.db.execute('SELECT rank, label FROM labels WHERE r = ? ORDER BY rank, rowid',
+                                       (c.n3(),)).fetchall()
+                cs.labels = [from_n3(lab) for rank, lab in rows if rank == rows[0][0]]
+        with profiler.phase('links'):
+            links = self.links()
+        return SchemaSummary(classes, links, self.aggregates)
+
+
+def summarize_stream(path: str) -> SchemaSummary:
+    summarizer = StreamingSummarizer()
+    for (s, p, o) in ntriples_stream(path):
+        summarizer.add(s, p, o)
+    return summarizer.summary()
+
+
+class TripleIndex:
+    """ On-disk index of a graph, built once next to the graph file (in file.idx/) and
+    memory-mapped by the later runs, which do not parse the graph again
+
+    The terms are numbered (in the order of their first occurrence) and stored in N3
+    in terms.dat, with their offsets in terms.off and their kind (IRI, blank node,
+    literal) in kinds.dat. The triples are stored as fixed-width records of three
+    32 bit term ids, sorted in the SPO order (spo.dat) and in the POS order (pos.dat),
+    so that the triples with a given subject, or with a given property and object,
+    are found by binary search. The summary is computed by scanning these arrays.
+    """
+
+    IRI, BLANK, LITERAL = 0, 1, 2
+    BATCH_SIZE = 100000
+
+    def __init__(self, directory: str):
+        with open(os.path.join(directory, 'meta.json')) as f:
+            self.meta = json.load(f)
+        self.files = []
+        self.terms = self.map(directory, 'terms.dat', 'B')
+        self.offsets = self.map(directory, 'terms.off', 'Q')
+        self.kinds = self.map(directory, 'kinds.dat', 'B')
+        self.spo = self.map(directory, 'spo.dat', 'I')
+        self.pos = self.map(directory, 'pos.dat', 'I')
+        self.nb_triples = self.meta['triples']
+
+    def map(self, directory: str, name: str, typecode: str):
+        path = os.path.join(directory, name)
+        if os.path.getsize(path) == 0:
+            return array(typecode)
+        f = open(path, 'rb')
+        self.files.append(f)
+        return memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)).cast(typecode)
+
+    @staticmethod
+    def source_stamp(path: str) -> dict:
+        st = os.stat(path)
+        return {'source': os.path.abspath(path), 'size': st.st_size, 'mtime': st.st_mtime_ns}
+
+    @classmethod
+    def open(cls, path: str) -> 'TripleIndex':
+        """ the index of the graph file path, built if it does not exist or if the file
+        has changed since it was built
+        """
+        directory = path + '.idx'
+        try:
+            index = cls(directory)
+            if all(index.meta.get(k) == v for k, v in cls.source_stamp(path).items()) and 'predicates' in index.meta:
+                return index
+        except (OSError, ValueError):
+            pass
+        cls.build(path, directory)
+        return cls(directory)
+
+    @classmethod
+    def build(cls, path: str, directory: str):
+        """ number the terms of the graph file and write the sorted triple arrays.
+        Only the term numbering is kept in memory: the triples are sorted by the
+        temporary SQLite database
+        """
+        os.makedirs(directory, exist_ok=True)
+        db = sqlite3.connect('')
+        db.execute('CREATE TABLE triples(s INTEGER, p INTEGER, o INTEGER)')
+        ids = {}
+        predicates = set()
+        offset = 0
+        offsets = array('Q', [0])
+        kinds = array('B')
+        batch = []
+        with open(os.path.join(directory, 'terms.dat'), 'wb') as terms:
+            def term_id(t: Node) -> int:
+                nonlocal offset
+                tid = ids.get(t)
+                if tid is None:
+                    tid = ids[t] = len(ids)
+                    data = t.n3().encode('utf-8')
+                    terms.write(data)
+                    offset += len(data)
+                    offsets.append(offset)
+                    kinds.append(cls.LITERAL if isinstance(t, Literal) else cls.BLANK if isinstance(t, BNode) else cls.IRI)
+                return tid
+            for s, p, o in shard_triples(path):
+                batch.append((term_id(s), term_id(p), term_id(o)))
+                predicates.add(p)
+                if len(batch) >= cls.BATCH_SIZE:
+                    db.executemany('INSERT INTO triples VALUES (?, ?, ?)', batch)
+                    batch.clear()
+            db.executemany('INSERT INTO triples VALUES (?, ?, ?)', batch)
+        with open(os.path.join(directory, 'terms.off'), 'wb') as f:
+            offsets.tofile(f)
+        with open(os.path.join(directory, 'kinds.dat'), 'wb') as f:
+            kinds.tofile(f)
+        for name, order in (('spo.dat', 's, p, o'), ('pos.dat', 'p, o, s')):
+            nb_triples = 0
+            with open(os.path.join(directory, name), 'wb') as f:
+                rows = db.execute(f'SELECT DISTINCT {order} FROM triples ORDER BY {order}')
+                while True:
+                    records = array('I', (tid for row in rows.fetchmany(cls.BATCH_SIZE) for tid in row))
+                    if not records: break
+                    records.tofile(f)
+                    nb_triples += len(records) // 3
+        meta = cls.source_stamp(path)
+        meta.update(triples=nb_triples, terms=len(ids), type=ids.get(RDF.type, -1),
+                    predicates={str(p): ids[p] for p in predicates})
+        with open(os.path.join(directory, 'meta.json'), 'w') as f:
+            json.dump(meta, f)
+
+    def term(self, tid: int) -> Node:
+        return from_n3(bytes(self.terms[self.offsets[tid]:self.offsets[tid + 1]]).decode('utf-8'))
+
+    def search(self, records, key: tuple) -> tuple:
+        """ the range [lo, hi) of the (sorted) records that start with key """
+        n = len(key)
+        def bound(strict: bool) -> int:
+            lo, hi = 0, len(records) // 3
+            while lo < hi:
+                mid = (lo + hi) // 2
+                prefix = tuple(records[3 * mid:3 * mid + n])
+                if prefix < key or (strict and prefix == key): lo = mid + 1
+                else: hi = mid
+            return lo
+        return bound(False), bound(True)
+
+    def objects(self, s: int, p: int) -> list:
+        lo, hi = self.search(self.spo, (s, p))
+        return list(self.spo[3 * lo + 2:3 * hi:3])
+
+    def summary(self) -> SchemaSummary:
+        T = self.meta['type']
+        L = {p: self.meta['predicates'][str(p)] for p in label_props if str(p) in self.meta['predicates']}
+        spo, pos, kinds = self.spo, self.pos, self.kinds
+        types = lru_cache(maxsize=PREFIXIZE_CACHE_SIZE)(lambda r: self.objects(r, T))
+        lo, end = self.search(pos, (T,))
+        runs = {}       # class -> range of its type triples in pos
+        while lo < end:
+            c = pos[3 * lo + 1]
+            runs[c] = self.search(pos, (T, c))
+            lo = runs[c][1]
+        summaries = {}
+        link_ids = {}
+        for c, (lo, hi) in runs.items():
+            if kinds[c] == self.BLANK: continue
+            with profiler.item('classes', self.term(c)):
+                attributes = {}
+                namespaces = {}
+                for k in range(lo, hi):
+                    s = pos[3 * k + 2]
+                    slo, shi = self.search(spo, (s,))
+                    degrees = {}
+                    for m in range(slo, shi):
+                        p, o = spo[3 * m + 1], spo[3 * m + 2]
+                        if kinds[o] == self.LITERAL:
+                            attributes[p] = None
+                            continue
+                        for z in types(o):
+                            if kinds[z] != self.BLANK: degrees[(p, z)] = degrees.get((p, z), 0) + 1
+                    for (p, z), degree in degrees.items():
+                        link_ids.setdefault((c, p, z), LinkStats()).add_subject(degree)
+                    if kinds[s] != self.BLANK:
+                        i = self.term(s)
+                        namespaces.setdefault(extractprefix(i), i)
+                summaries[self.term(c)] = ClassSummary(
+                    labels=first_labels({p: [self.term(lab) for lab in self.objects(c, l)] for p, l in L.items()}),
+                    attributes=[self.term(p) for p in attributes],
+                    nb_instances=hi - lo,
+                    instances=list(namespaces.values()))
+        links = {(self.term(x), self.term(p), self.term(z)): stats for (x, p, z), stats in link_ids.items()}
+        return SchemaSummary(list(summaries), links, summaries)
+
+
+class GroupSummary(SchemaSummary):
+    """ SchemaSummary whose classes may be groups (of resources or of classes) named by a
+    plain string, such as the characteristic sets CS1, CS2... or the namespace groups p0:*
+    """
+
+    def class_name(self, class_uri) -> str:
+        return prefixize(class_uri) if isinstance(class_uri, Node) else class_uri
+
+
+class CharacteristicSetSummarizer:
+    """ Summarizes a graph by its characteristic sets instead of its rdf:type triples
+
+    The characteristic set of a subject is the set of the properties it uses. The sets
+    used by fewer than min_support subjects are merged into their nearest frequent
+    superset (the one with the fewest additional properties, then the most frequent),
+    if any. Each remaining set is a 'class' whose instances are the subjects of the set
+    and of the sets merged into it, with, as label, the types of most of its instances.
+    Untyped resources are thus summarized like typed ones.
+    """
+
+    def __init__(self, min_support: int = 10):
+        self.min_support = min_support
+        self.properties = {}    # subject -> {property: None}
+        self.attributes = {}    # subject -> properties with a literal value
+        self.edges = {}         # subject -> {(property, resource): None}
+        self.types = {}         # subject -> {class: None}
+
+    def add(self, s: Node, p: Node, o: Node):
+        self.properties.setdefault(s, {})[p] = None
+        if p == RDF.type:
+            self.types.setdefault(s, {})[o] = None
+        elif isinstance(o, Literal):
+            self.attributes.setdefault(s, set()).add(p)
+        else:
+            self.edges.setdefault(s, {})[(p, o)] = None
+
+    def charsets(self) -> dict:
+        """ subject -> name of its (possibly merged) characteristic set """
+        counts = {}
+        for s, properties in self.properties.items():
+            cs = frozenset(properties)
+            counts[cs] = counts.get(cs, 0) + 1
+        ranked = sorted(counts, key=counts.get, reverse=True)
+        frequent = [cs for cs in ranked if counts[cs] >= self.min_support]
+        target = {cs: cs for cs in frequent}
+        for cs in ranked:
+            if cs in target: continue
+            supersets = [f for f in frequent if cs < f]
+            target[cs] = min(supersets, key=lambda f: len(f) - len(cs)) if supersets else cs
+        names = {}
+        for cs in ranked:
+            if target[cs] not in names: names[target[cs]] = f'CS{len(names) + 1}'
+        return {s: names[target[frozenset(properties)]] for s, properties in self.properties.items()}
+
+    def summary(self) -> GroupSummary:
+        charset = self.charsets()
+        members = {}
+        for s, name in charset.items():
+            members.setdefault(name, []).append(s)
+        summaries = {}
+        for name in sorted(members, key=lambda name: int(name[2:])):
+            subjects = members[name]
+            attributes = {}
+            types = {}
+            namespaces = {}
+            for s in subjects:
+                for p in self.attributes.get(s, ()):
+                    attributes[p] = attributes.get(p, 0) + 1
+                for c in self.types.get(s, ()):
+                    types[c] = types.get(c, 0) + 1
+                if not isinstance(s, BNode):
+                    namespaces.setdefault(extractprefix(s), s)
+            main_types = [c for c in sorted(types, key=types.get, reverse=True) if 2 * types[c] >= len(subjects)]
+            summaries[name] = ClassSummary(
+                labels=[' '.join(prefixize(c) for c in main_types[:3])] if main_types else [],
+                attributes=sorted(attributes, key=attributes.get, reverse=True),
+                nb_instances=len(subjects),
+                instances=list(namespaces.values()))
+        links = {}
+        for s, edges in self.edges.items():
+            degrees = {}
+            for (p, o) in edges:
+                if o in charset:
+                    degrees[(p, charset[o])] = degrees.get((p, charset[o]), 0) + 1
+            for (p, z), degree in degrees.items():
+                links.setdefault((charset[s], p, z), LinkStats()).add_subject(degree)
+        return GroupSummary(list(summaries), links, summaries)
+
+
+def summarize_charsets(locations: list, min_support: int = 10) -> GroupSummary:
+    """ the characteristic sets of the triples of the files (or directories or glob
+    patterns of files) taken as one graph
+    """
+    summarizer = CharacteristicSetSummarizer(min_support)
+    for loc in locations:
+        for path in (shard_paths(loc) if os.path.isdir(loc) or glob.has_magic(loc) else [loc]):
+            for s, p, o in shard_triples(path):
+                summarizer.add(s, p, o)
+    return summarizer.summary()
+
+
+class EndpointSummary(SchemaSummary):
+    """ SchemaSummary of the graph at a SPARQL endpoint, computed with a handful of
+    aggregate queries sent directly to the endpoint
+
+    With a page_size, the results are read page by page (LIMIT/OFFSET with an ORDER BY)
+    and the instance namespaces are computed on the client, from the instances of each
+    class read page_size at a time with keyset pagination (no server-side aggregation
+    over all the instances).
+    """
+
+    def __init__(self, endpoint_url: str, timeout: float = None, page_size: int = 0, retries: int = 0):
+        self.endpoint_url = endpoint_url
+        self.timeout = timeout
+        self.page_size = page_size
+        self.retries = retries
+
+        # classes and number of instances
+
+        qc =  f"""
+                    SELECT ?c (COUNT(?x) AS ?n)
+                    WHERE {{ ?x rdf:type ?c.  FILTER(! ISBLANK(?c) ) }}
+                    GROUP BY ?c
+                    """
+        summaries = {}
+        for r in self.rows(qc, '?c'):
+            summaries[r.c] = ClassSummary(nb_instances=int(r.n))
+
+        qref =  f"""
+                    SELECT ?x ?p ?z (COUNT(?s) AS ?subjects) (SUM(?d) AS ?triples)
+                           (MIN(?d) AS ?mind) (MAX(?d) AS ?maxd)
+                    WHERE {{
+                        SELECT ?x ?p ?z ?s (COUNT(?o) AS ?d)
+                        WHERE {{ ?s rdf:type ?x. ?o rdf:type ?z . ?s ?p ?o.  FILTER(! ISBLANK(?z) ) }}
+                        GROUP BY ?x ?p ?z ?s
+                    }}
+                    GROUP BY ?x ?p ?z
+                    """
+        links = {}
+        for r in self.rows(qref, '?x ?p ?z'):
+            if r.x is None: continue    # the empty group of a graph without links
+            links[(r.x, r.p, r.z)] = LinkStats(int(r.triples), int(r.subjects), int(r.mind), int(r.maxd))
+
+        # attributes, one label and the instance prefixes of each class
+
+        qattr =  f"""
+                    SELECT DISTINCT ?c ?p 
+                    WHERE {{ ?s rdf:type ?c. ?s ?p ?o.  FILTER(ISLITERAL(?o) ) }}
+                    """
+        for r in self.rows(qattr, '?c ?p'):
+            if r.c in summaries: summaries[r.c].attributes.append(r.p)
+
+        # one label per property and language, for --lang
+        qlab =  f"""
+                    SELECT ?c ?p ?lang (SAMPLE(?lab) AS ?label)
+                    WHERE {{ 
+                        {{ SELECT DISTINCT ?c WHERE {{ ?x rdf:type ?c. }} }}
+                        VALUES ?p {{ {' '.join(p.n3() for p in label_props)} }}
+                        ?c ?p ?lab . BIND(LANG(?lab) AS ?lang)
+                    }}
+                    GROUP BY ?c ?p ?lang
+                    """
+        labels = {}
+        for r in self.rows(qlab, '?c ?p ?lang'):
+            if r.c in summaries: labels.setdefault(r.c, {}).setdefault(r.p, []).append(r.label)
+        for c, labs in labels.items():
+            summaries[c].labels = first_labels(labs)
+
+        if page_size:
+            for c, cs in summaries.items():
+                with profiler.item('classes', c):
+                    cs.instances = self.instance_namespaces(c)
+            super().__init__(list(summaries), links, summaries)
+            return
+
+        # the instance namespaces, as in extractprefix
+
+        qpfx =  f"""
+                    SELECT ?c ?ns (SAMPLE(?i) AS ?inst)
+                    WHERE {{ 
+                        ?i rdf:type ?c. FILTER(!ISBLANK(?i))
+                        BIND(IF(CONTAINS(STR(?i), "#"), CONCAT(STRBEFORE(STR(?i), "#"), "#"),
+                                REPLACE(STR(?i), "/[^/]+$", "/")) AS ?ns)
+                    }}
+                    GROUP BY ?c ?ns
+                    """
+        for r in self.query(qpfx):
+            if r.c in summaries: summaries[r.c].instances.append(r.inst)
+
+        super().__init__(list(summaries), links, summaries)
+
+    def query(self, query: str) -> Result:
+        return sparql_select(self.endpoint_url, query, self.timeout, self.retries)
+
+    def rows(self, query: str, order_by: str):
+        """ the rows of query, page by page if there is a page_size """
+        if not self.page_size:
+            return self.query(query)
+        return sparql_pages(self.endpoint_url, query, order_by, self.page_size, self.timeout, self.retries)
+
+    def instance_namespaces(self, c: Node) -> list:
+        """ one instance of c per namespace, reading the IRI instances of c in the order of
+        their IRI, each page starting after the last IRI of the previous one
+        """
+        namespaces = {}
+        last = ''
+        while True:
+            qinst = f"""
+                    SELECT ?i
+                    WHERE {{ ?i rdf:type {c.n3()} . FILTER(ISIRI(?i) && STR(?i) > {Literal(last).n3()}) }}
+                    ORDER BY STR(?i) LIMIT {self.page_size}
+                    """
+            n = 0
+            for r in self.query(qinst):
+                n += 1
+                last = str(r.i)
+                namespaces.setdefault(extractprefix(r.i), r.i)
+            if n < self.page_size:
+                return list(namespaces.values())
+
+
+def is_timeout(e: Exception) -> bool:
+    """ whether e comes from a request that timed out (on the client or on the server) """
+    if isinstance(e, HTTPError):
+        return e.code in (408, 503, 504)
+    if isinstance(e, URLError):
+        return isinstance(e.reason, TimeoutError)
+    return isinstance(e, TimeoutError)
+
+
+def sparql_select(endpoint_url: str, query: str, timeout: float = None, retries: int = 0) -> Result:
+    """ send a SELECT query to a SPARQL endpoint (the request is limited by the timeout).
+    A request that times out is sent again, at most retries times, after 1, 2, 4... seconds
+    """
+    request = Request(endpoint_url, data=urlencode({'query': PREFIXES + query}).encode(),
+                      headers={'Accept': 'application/sparql-results+json'})
+    for attempt in range(retries + 1):
+        try:
+            start = time.perf_counter()
+            with urlopen(request, timeout=timeout) as response:
+                result = Result.parse(BytesIO(response.read()), content_type='application/sparql-results+json')
+            profiler.record_query(query, time.perf_counter() - start, len(result))
+            return result
+        except Exception as e:
+            if attempt == retries or not is_timeout(e): raise
+            print(f'// WARNING // {endpoint_url}: {e}, retrying', file=sys.stderr)
+            time.sleep(2 ** attempt)
+
+
+def sparql_pages(endpoint_url: str, query: str, order_by: str, page_size: int,
+                 timeout: float = None, retries: int = 0):
+    """ generate the rows of a SELECT query, reading page_size rows at a time with
+    LIMIT/OFFSET; order_by must give a total order of the rows so that the pages
+    do not overlap
+    """
+    offset = 0
+    while True:
+        page = sparql_select(endpoint_url, f'{query} ORDER BY {order_by} LIMIT {page_size} OFFSET {offset}',
+                             timeout, retries)
+        n = 0
+        for r in page:
+            n += 1
+            yield r
+        if n < page_size: return
+        offset += page_size
+
+
+class InstanceSampler:
+    """ Reservoir samples of at most `capacity` instances per class, drawn from blocks of
+    (instance, class) type pairs, with an estimate of the number of instances of each class
+
+    The type triples are seen as nb_blocks blocks of equal size, of which the sampler gets
+    a random subset. The class sizes are estimated as in cluster sampling, with a 95%
+    error bound; when all the blocks are read the counts are exact.
     """
-    qinst = f"""
-            SELECT ?i
-            WHERE {{ 
-                {service}
-                {{ ?i rdf:type <{class_uri}>. FILTER(!ISBLANK(?i))}}
-            }}
+
+    def __init__(self, capacity: int, nb_blocks: int, rng: random.Random):
+        self.capacity = capacity
+        self.nb_blocks = nb_blocks
+        self.rng = rng
+        self.samples = {}       # class -> sampled instances
+        self.seen = {}          # class -> number of instances met
+        self.block_counts = []  # for each block read: class -> number of instances in the block
+
+    def add_block(self, pairs):
+        counts = {}
+        for (i, c) in pairs:
+            counts[c] = counts.get(c, 0) + 1
+            seen = self.seen.get(c, 0)
+            self.seen[c] = seen + 1
+            sample = self.samples.setdefault(c, [])
+            if len(sample) < self.capacity:
+                sample.append(i)
+            else:
+                j = self.rng.randrange(seen + 1)
+                if j < self.capacity: sample[j] = i
+        self.block_counts.append(counts)
+
+    def estimate(self, c: Node) -> tuple:
+        """ (estimated number of instances of c, error bound) """
+        m = len(self.block_counts)
+        ys = [counts.get(c, 0) for counts in self.block_counts]
+        mean = sum(ys) / m
+        if m >= self.nb_blocks or m < 2:
+            return (sum(ys) if m >= self.nb_blocks else self.nb_blocks * mean, 0.0)
+        var = sum((y - mean) ** 2 for y in ys) / (m - 1)
+        error = 1.96 * self.nb_blocks * math.sqrt((1 - m / self.nb_blocks) * var / m)
+        return (self.nb_blocks * mean, error)
+
+    def summary(self, summarizer: SchemaSummarizer) -> SchemaSummary:
+        """ the SchemaSummary of the sampled classes, from a summarizer fed with the
+        triples of the sampled instances
+        """
+        summary = summarizer.summary()
+        classes = [c for c in self.samples if not isinstance(c, BNode)]
+        summaries = {}
+        for c in classes:
+            cs = summary.class_summaries.get(c, ClassSummary())
+            (nb, error) = self.estimate(c)
+            cs.nb_instances = round(nb)
+            cs.error = error
+            cs.sample = len(self.samples[c])
+            summaries[c] = cs
+        return SchemaSummary(classes, summary.links, summaries)
+
+
+SAMPLE_BLOCK_SIZE = 100
+SAMPLE_SEED = 0
+
+def sample_graph(g: Graph, capacity: int) -> SchemaSummary:
+    """ approximate SchemaSummary of an rdflib graph: all the type triples are read (so the
+    counts are exact) but only the triples of the sampled instances are examined
+    """
+    pairs = [(i, c) for (i, _, c) in g.triples((None, RDF.type, None))]
+    blocks = [pairs[k:k + SAMPLE_BLOCK_SIZE] for k in range(0, len(pairs), SAMPLE_BLOCK_SIZE)]
+    sampler = InstanceSampler(capacity, len(blocks), random.Random(SAMPLE_SEED))
+    for block in blocks:
+        sampler.add_block(block)
+
+    summarizer = SchemaSummarizer()
+    for c, sample in sampler.samples.items():
+        for i in sample:
+            summarizer.add(i, RDF.type, c)
+            for p, o in g.predicate_objects(i):
+                if p == RDF.type: continue
+                summarizer.add(i, p, o)
+                for z in g.objects(o, RDF.type):
+                    summarizer.add(o, RDF.type, z)
+        for p in label_props:
+            for lab in g.objects(c, p):
+                summarizer.add(c, p, lab)
+    return sampler.summary(summarizer)
+
+
+def sample_endpoint(endpoint_url: str, capacity: int, nb_sample_blocks: int, timeout: float = None,
+                    retries: int = 0) -> SchemaSummary:
+    """ approximate SchemaSummary of the graph at a SPARQL endpoint: nb_sample_blocks blocks
+    of type triples are read, and only the triples of the sampled instances are queried
+    (blank node instances are counted but not examined)
+
+    The blocks need no order of the type triples (sorting them at each OFFSET would cost
+    more than the exact summary): the instances are spread in 16^k blocks by the first k
+    hex digits of the MD5 of their IRI (of a random number for the blank nodes), and the
+    type triples of the sampled blocks are read with one scan.
+    """
+    qtotal = """SELECT (COUNT(*) AS ?n) WHERE { ?i rdf:type ?c }"""
+    total = int(next(iter(sparql_select(endpoint_url, qtotal, timeout, retries))).n)
+    digits = max(1, math.ceil(math.log(max(1, total / SAMPLE_BLOCK_SIZE), 16)))
+    nb_blocks = 16 ** digits
+    rng = random.Random(SAMPLE_SEED)
+    sampler = InstanceSampler(capacity, nb_blocks, rng)
+    blocks = [f'{b:0{digits}x}' for b in sorted(rng.sample(range(nb_blocks), min(nb_sample_blocks, nb_blocks)))]
+    sampled = f'FILTER(?b IN ({", ".join(Literal(b).n3() for b in blocks)}))' if len(blocks) < nb_blocks else ''
+    qblock = f"""SELECT ?i ?c ?b
+                 WHERE {{ ?i rdf:type ?c
+                          BIND(SUBSTR(MD5(IF(ISBLANK(?i), STR(RAND()), STR(?i))), 1, {digits}) AS ?b)
+                          {sampled} }}"""
+    pairs = {b: [] for b in blocks}
+    for r in sparql_select(endpoint_url, qblock, timeout, retries):
+        pairs[str(r.b)].append((r.i, r.c))
+    for b in blocks:
+        sampler.add_block(pairs[b])
+
+    summarizer = SchemaSummarizer()
+    instances = {}
+    for c, sample in sampler.samples.items():
+        for i in sample:
+            summarizer.add(i, RDF.type, c)
+            if not isinstance(i, BNode): instances[i] = None
+    instances = list(instances)
+    for k in range(0, len(instances), SAMPLE_BLOCK_SIZE):
+        values = ' '.join(i.n3() for i in instances[k:k + SAMPLE_BLOCK_SIZE])
+        qinst = f"""
+                    SELECT ?i ?p ?o ?z
+                    WHERE {{ VALUES ?i {{ {values} }} ?i ?p ?o . OPTIONAL {{ ?o rdf:type ?z }} }}
+                    """
+        for r in sparql_select(endpoint_url, qinst, timeout, retries):
+            if r.p == RDF.type: continue
+            summarizer.add(r.i, r.p, r.o)
+            if r.z is not None: summarizer.add(r.o, RDF.type, r.z)
+
+    qlab = f"""
+            SELECT ?c ?p ?lang (SAMPLE(?lab) AS ?label)
+            WHERE {{ VALUES ?c {{ {' '.join(c.n3() for c in sampler.samples if not isinstance(c, BNode))} }}
+                     VALUES ?p {{ {' '.join(p.n3() for p in label_props)} }}
+                     ?c ?p ?lab . BIND(LANG(?lab) AS ?lang) }}
+            GROUP BY ?c ?p ?lang
             """
-    qres = g.query(qinst)
-    pfxset = set()
-    for r in qres:
-        ip = prefixize(r.i)
-        pfxset.add(ip.split(':')[0])
-    iplist = ''
-    for pfx in pfxset:
-        iplist += (pfx + "\\l")
-    return iplist
+    for r in sparql_select(endpoint_url, qlab, timeout, retries):
+        if r.c in sampler.samples: summarizer.add(r.c, r.p, r.label)
+    return sampler.summary(summarizer)
+
+
+# Sharded sources: a directory or a glob pattern of files summarized in parallel processes.
+# A first pass collects the type triples of every shard, a second pass summarizes the
+# other triples of each shard, with the types of its resources taken from all the shards.
+
+_shard_types = {}       # resource -> classes, over all the shards (set in each worker of the second pass)
+_shard_classes = set()
+
+
+def shard_paths(location: str) -> list:
+    """ the files of a directory or matching a glob pattern, in name order """
+    if os.path.isdir(location):
+        return sorted(os.path.join(location, f) for f in os.listdir(location)
+                      if os.path.isfile(os.path.join(location, f)))
+    return sorted(glob.glob(location))
+
+
+def shard_triples(path: str):
+    """ the triples of a shard: N-Triples files are read one line at a time and their
+    blank node labels are shared by all the shards
+    """
+    if re.search(r'\.nt(\.gz)?$', path):
+        yield from ntriples_stream(path)
+        return
+    g = Graph()
+    g.parse(path)
+    for s in sorted(set(g.subjects())):
+        for p, o in g.predicate_objects(s):
+            yield (s, p, o)
+
+
+def summarize_shard_types(path: str):
+    """ first pass: the SchemaSummary of the type triples of a shard (classes, instance
+    counts, instance prefixes) and the list of its (resource, class) pairs
+    """
+    summarizer = SchemaSummarizer()
+    pairs = []
+    for s, p, o in shard_triples(path):
+        if p == RDF.type and (s, o) not in summarizer.type_rank:
+            summarizer.add_type(s, o)
+            pairs.append((s, o))
+    summary = summarizer.summary()
+    summary.links = {}
+    return summary, pairs
+
+
+def _init_shard_worker(types: dict, properties: list):
+    global _shard_types, _shard_classes, label_props
+    _shard_types = types
+    label_props = properties
+    _shard_classes = {c for classes in types.values() for c in classes}
+
+
+def summarize_shard_links(path: str) -> SchemaSummary:
+    """ second pass: the attributes, labels and links of the classes in a shard, the
+    resources being typed with their types in all the shards. The instances are
+    counted by the first pass.
+    """
+    summarizer = SchemaSummarizer()
+    labels = {}
+    for s, p, o in shard_triples(path):
+        if p == RDF.type:
+            summarizer.add_type(s, o)
+            continue
+        summarizer.add(s, p, o)
+        if p in label_props and s in _shard_classes:
+            labels.setdefault(s, {}).setdefault(p, {})[o] = None
+    resources = dict.fromkeys(summarizer.properties)
+    for edges in summarizer.edges.values():
+        resources.update(dict.fromkeys(o for (p, o) in edges))
+    for r in resources:
+        for c in _shard_types.get(r, ()):
+            summarizer.add_type(r, c)
+    summary = summarizer.summary()
+    for cs in summary.class_summaries.values():
+        cs.nb_instances = 0
+    for c, labs in labels.items():
+        if c not in summary.class_summaries:
+            summary.classes.append(c)
+            summary.class_summaries[c] = ClassSummary()
+        summary.class_summaries[c].labels = first_labels(labs)
+    return summary
+
+
+def summarize_shards(paths: list, jobs: int = 4) -> SchemaSummary:
+    """ summarize the shards in jobs processes and merge their partial summaries.
+    The link degrees are computed per shard: a subject whose triples are spread over
+    several shards counts as several subjects in the cardinalities.
+    """
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        first_pass = list(executor.map(summarize_shard_types, paths))
+    types = {}
+    for summary, pairs in first_pass:
+        for r, c in pairs:
+            classes = types.setdefault(r, [])
+            if c not in classes: classes.append(c)
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_shard_worker, initargs=(types, label_props)) as executor:
+        second_pass = list(executor.map(summarize_shard_links, paths))
+    return merge_summaries([summary for summary, pairs in first_pass] + second_pass)
+
+
+def _count(table: dict, key, subkey, delta: int):
+    """ adds delta to table[key][subkey], removing the entries that drop to 0 """
+    counts = table.setdefault(key, {})
+    n = counts.get(subkey, 0) + delta
+    if n:
+        counts[subkey] = n
+    else:
+        counts.pop(subkey, None)
+        if not counts: del table[key]
+
+
+class SummaryState:
+    """ A schema summary that is updated with added and removed triples, and saved in a
+    state file between two runs
+
+    For each resource, the state keeps its types, its number of triples with a literal
+    value per property, its edges and its labels (but not the literal values). The class
+    level data are reference counts: the instances and instance namespaces of each class,
+    the number of triples of each attribute and, for each link, the number of subjects with
+    each degree. An attribute or a link thus disappears with its last triple.
+
+    The deltas must be exact: an added triple is not already in the graph and a removed
+    triple is in it. Blank nodes can only be matched across N-Triples files.
+    """
+
+    def __init__(self):
+        self.types = {}         # resource -> {class: None}
+        self.literals = {}      # subject -> {property: number of triples with a literal value}
+        self.edges = {}         # subject -> {(property, resource): 1}
+        self.incoming = {}      # resource -> {(subject, property): 1}
+        self.labels = {}        # resource -> {(label property, label): 1}
+        self.degrees = {}       # subject -> {(property, class): number of edges to instances of the class}
+        self.instances = {}     # class -> number of instances
+        self.namespaces = {}    # class -> {namespace: number of instances}
+        self.attributes = {}    # class -> {property: number of triples}
+        self.link_degrees = {}  # (class, property, class) -> {degree: number of subjects}
+
+    def update(self, s: Node, p: Node, o: Node, delta: int):
+        """ adds (delta = 1) or removes (delta = -1) the triple (s p o) """
+        if isinstance(o, Literal):
+            _count(self.literals, s, p, delta)
+            for c in self.types.get(s, ()):
+                _count(self.attributes, c, p, delta)
+            if p in label_props:
+                _count(self.labels, s, (p, o), delta)
+            return
+        if ((p, o) in self.edges.get(s, ())) == (delta > 0): return
+        _count(self.edges, s, (p, o), delta)
+        _count(self.incoming, o, (s, p), delta)
+        for z in list(self.types.get(o, ())):
+            if not isinstance(z, BNode): self._add_degree(s, p, z, delta)
+        if p == RDF.type:
+            self._retype(s, o, delta)
+
+    def _add_degree(self, s: Node, p: Node, z: Node, delta: int):
+        """ changes by delta the number of (s p o) edges with o an instance of z """
+        old = self.degrees.get(s, {}).get((p, z), 0)
+        for x in self.types.get(s, ()):
+            if old: _count(self.link_degrees, (x, p, z), old, -1)
+            if old + delta: _count(self.link_degrees, (x, p, z), old + delta, 1)
+        _count(self.degrees, s, (p, z), delta)
+
+    def _retype(self, s: Node, c: Node, delta: int):
+        """ adds or removes the type c of s, with the contributions of s to the data of c
+        (as an instance of c, then as a link target)
+        """
+        if delta > 0:
+            self._add_instance(s, c, delta)
+            self.types.setdefault(s, {})[c] = None
+        if not isinstance(c, BNode):
+            for (r, p) in list(self.incoming.get(s, ())):
+                self._add_degree(r, p, c, delta)
+        if delta < 0:
+            del self.types[s][c]
+            if not self.types[s]: del self.types[s]
+            self._add_instance(s, c, delta)
+
+    def _add_instance(self, s: Node, c: Node, delta: int):
+        n = self.instances.get(c, 0) + delta
+        if n: self.instances[c] = n
+        else: del self.instances[c]
+        if not isinstance(s, BNode):
+            _count(self.namespaces, c, extractprefix(s), delta)
+        for p, n in self.literals.get(s, {}).items():
+            _count(self.attributes, c, p, delta * n)
+        for (p, z), degree in self.degrees.get(s, {}).items():
+            _count(self.link_degrees, (c, p, z), degree, delta)
+
+    def class_summary(self, c: Node) -> ClassSummary:
+        labels = {}
+        for p, lab in self.labels.get(c, {}):
+            labels.setdefault(p, []).append(lab)
+        return ClassSummary(labels=first_labels(labels),
+                            attributes=list(self.attributes.get(c, {})),
+                            nb_instances=self.instances[c],
+                            instances=[URIRef(ns) for ns in self.namespaces.get(c, {})])
+
+    def summary(self) -> SchemaSummary:
+        classes = [c for c in self.instances if not isinstance(c, BNode)]
+        links = {}
+        for link, degrees in self.link_degrees.items():
+            stats = links[link] = LinkStats()
+            for degree, nb_subjects in degrees.items():
+                stats.merge(LinkStats(degree * nb_subjects, nb_subjects, degree, degree))
+        return SchemaSummary(classes, links, {c: self.class_summary(c) for c in classes})
+
+    def save(self, path: str):
+        with open(path, 'wb') as f:
+            pickle.dump(self, f, pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def load(path: str) -> 'SummaryState':
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+
+
+def update_state(state_file: str, sources: list, removed: list, added: list) -> SummaryState:
+    """ the SummaryState of the source files (or, without sources, the one saved in
+    state_file), updated with the triples of the removed and added files and saved
+    in state_file
+    """
+    if sources:
+        state = SummaryState()
+        sources = [path for loc in sources
+                   for path in (shard_paths(loc) if os.path.isdir(loc) or glob.has_magic(loc) else [loc])]
+    else:
+        state = SummaryState.load(state_file)
+    # the sources first: the removed triples must be in the state
+    for delta, paths in ((1, sources), (-1, removed), (1, added)):
+        for path in paths:
+            for s, p, o in shard_triples(path):
+                state.update(s, p, o, delta)
+    state.save(state_file)
+    return state
+
+
+def summarize_source(location: str, stream_flag: bool = False, timeout: float = None,
+                     sample: int = 0, sample_blocks: int = 100, jobs: int = 4,
+                     page_size: int = 0, retries: int = 0, index_flag: bool = False) -> SchemaSummary:
+    """ the SchemaSummary of a file, of a directory or glob pattern of files (shards) or
+    of a SPARQL endpoint (approximate if sample > 0)
+    """
+    if location.startswith(('http://', 'https://')):
+        if sample: return sample_endpoint(location, sample, sample_blocks, timeout, retries)
+        return EndpointSummary(location, timeout, page_size, retries)
+    if os.path.isdir(location) or glob.has_magic(location):
+        return summarize_shards(shard_paths(location), jobs)
+    if index_flag:
+        return TripleIndex.open(location).summary()
+    if stream_flag and re.search(r'\.n[tq](\.gz)?$', location):
+        return summarize_stream(location)
+    g = Graph()
+    with profiler.phase(f'parse {location}'):
+        g.parse(location)
+    if sample: return sample_graph(g, sample)
+    return summarize(graph_triples(g))
+
+
+def merge_summaries(summaries: list) -> SchemaSummary:
+    """ merge the SchemaSummaries of several sources, recording in each ClassSummary
+    the sources of the class. Instance counts are added up.
+    """
+    classes = {}
+    links = {}
+    merged = {}
+    for no, summary in enumerate(summaries, 1):
+        for c in summary.classes:
+            cs = summary.class_summary(c)
+            if c not in merged:
+                classes[c] = None
+                merged[c] = ClassSummary()
+            mcs = merged[c]
+            labels = {str(l) for l in mcs.labels}
+            mcs.labels.extend(l for l in cs.labels if str(l) not in labels)
+            mcs.attributes.extend(p for p in cs.attributes if p not in mcs.attributes)
+            mcs.nb_instances += cs.nb_instances
+            mcs.error = math.sqrt(mcs.error ** 2 + cs.error ** 2)
+            mcs.sample += cs.sample
+            namespaces = {extractprefix(i) for i in mcs.instances}
+            mcs.instances.extend(i for i in cs.instances if extractprefix(i) not in namespaces)
+            mcs.sources.append(no)
+        for link, stats in summary.links.items():
+            links.setdefault(link, LinkStats()).merge(stats)
+    return SchemaSummary(list(classes), links, merged)
+
+
+def in_thread(fn, *args) -> Future:
+    """ the future of fn(*args) run in a daemon thread, which does not keep the program
+    running if its result is given up (a source that timed out)
+    """
+    future = Future()
+    def run():
+        try:
+            future.set_result(fn(*args))
+        except Exception as e:
+            future.set_exception(e)
+    threading.Thread(target=run, daemon=True).start()
+    return future
+
+
+def summarize_sources(locations: list, stream_flag: bool = False, jobs: int = 4, timeout: float = None,
+                      sample: int = 0, sample_blocks: int = 100,
+                      page_size: int = 0, retries: int = 0, index_flag: bool = False) -> SchemaSummary:
+    """ summarize the sources concurrently (at most jobs at a time) and merge their summaries.
+    A source that fails, or is not summarized within timeout seconds of its start, is
+    reported on stderr and left out; the thread of a source left out cannot be stopped, it
+    takes one of the jobs until it ends.
+    """
+    todo = list(locations)
+    running = {}        # future -> (location, deadline)
+    abandoned = set()   # futures of the sources left out whose thread still runs
+    summaries = {loc: SchemaSummary([], {}, {}) for loc in locations}
+    while todo or running:
+        abandoned = {future for future in abandoned if not future.done()}
+        while todo and len(running) + len(abandoned) < jobs:
+            loc = todo.pop(0)
+            future = in_thread(summarize_source, loc, stream_flag, timeout, sample, sample_blocks, jobs,
+                               page_size, retries, index_flag)
+            running[future] = (loc, time.monotonic() + timeout if timeout else None)
+        deadlines = [deadline for _, deadline in running.values() if deadline is not None]
+        wait(list(running) + list(abandoned), max(0, min(deadlines) - time.monotonic()) if deadlines else None,
+             FIRST_COMPLETED)
+        for future, (loc, deadline) in list(running.items()):
+            if future.done():
+                try:
+                    summaries[loc] = future.result()
+                except Exception as e:
+                    print(f'// ERROR // {loc}: {e}', file=sys.stderr)
+            elif deadline is not None and time.monotonic() >= deadline:
+                print(f'// ERROR // {loc}: not summarized within {timeout}s', file=sys.stderr)
+                abandoned.add(future)
+            else:
+                continue
+            del running[future]
+    return merge_summaries(list(summaries.values()))
+
+
+def find_instance_prefixes(instances: list) -> list:
+    """ the prefixes of the instances
+    """
+    pfxset = {}
+    for i in instances:
+        ip = prefixize(i)
+        pfxset[ip.split(':')[0]] = None
+    return list(pfxset)
 
 def is_metaclass_name(prefixed_class_name: str):
     return prefixed_class_name.split(':')[0] in ['rdf','rdfs','owl']
+
+
+# Level of detail: between the summary and the view, the classes can be collapsed into
+# namespace groups, or all but the top classes folded into namespace groups, and the
+# links limited to the heaviest ones, so that the layout of large views stays tractable.
+
+def namespace_group(name: str) -> str:
+    """ the name of the group of the classes of a namespace, e.g. p0:* """
+    return name.split(':')[0] + ':*' if ':' in name else '*'
+
+
+def group_classes(summary: SchemaSummary, group_of: dict) -> GroupSummary:
+    """ the summary where the classes are replaced by their group in group_of (a class
+    mapped to itself, or alone in its group, stays as is). A group shows the number of
+    its classes as label and the union of their attributes and instance prefixes; the
+    links between the classes become links between their groups
+    """
+    members = {}
+    for c in summary.classes:
+        members.setdefault(group_of.get(c, c), []).append(c)
+    group_of = {c: g for g, classes in members.items() if len(classes) > 1 for c in classes}
+    summaries = {}
+    for g, classes in members.items():
+        if len(classes) == 1:
+            summaries[classes[0]] = summary.class_summary(classes[0])
+            continue
+        gcs = summaries[g] = ClassSummary(labels=[f'{len(classes)} classes'])
+        namespaces = {}
+        for c in classes:
+            cs = summary.class_summary(c)
+            gcs.attributes.extend(p for p in cs.attributes if p not in gcs.attributes)
+            gcs.nb_instances += cs.nb_instances
+            gcs.error = math.sqrt(gcs.error ** 2 + cs.error ** 2)
+            gcs.sample += cs.sample
+            gcs.sources.extend(no for no in cs.sources if no not in gcs.sources)
+            for i in cs.instances:
+                namespaces.setdefault(extractprefix(i), i)
+        gcs.instances = list(namespaces.values())
+    links = {}
+    for (x, p, z), stats in summary.links.items():
+        link = (group_of.get(x, x), p, group_of.get(z, z))
+        links.setdefault(link, LinkStats()).merge(stats)
+    return GroupSummary(list(summaries), links, summaries)
+
+
+def level_of_detail(summary: SchemaSummary, collapse: bool = False, top: int = 0,
+                    max_nodes: int = 0, max_edges: int = 0) -> SchemaSummary:
+    """ the summary with
+    - collapse: one node per namespace instead of one per class
+    - top: only the top classes by weight (instances + triples of their links), the
+      other ones being folded into one node per namespace
+    - max_nodes: as many top classes as possible within max_nodes nodes
+    - max_edges: only the max_edges heaviest links (by number of triples)
+    The metaclasses (rdf:, rdfs:, owl:) are left out, as in the view.
+    """
+    names = {c: summary.class_name(c) for c in summary.classes}
+    shown = [c for c in summary.classes if not is_metaclass_name(names[c])]
+    if collapse:
+        summary = group_classes(summary, {c: namespace_group(names[c]) for c in shown})
+    elif top or (max_nodes and len(shown) > max_nodes):
+        weight = {c: summary.class_summary(c).nb_instances for c in shown}
+        for (x, p, z), stats in summary.links.items():
+            for c in {x, z}:
+                if c in weight: weight[c] += stats.triples
+        ranked = sorted(shown, key=weight.get, reverse=True)
+        k = top or max_nodes
+        while True:
+            others = {namespace_group(names[c]) for c in ranked[k:]}
+            if not max_nodes or k + len(others) <= max_nodes or k == 0: break
+            k -= 1
+        summary = group_classes(summary, {c: namespace_group(names[c]) for c in ranked[k:]})
+    if max_edges:
+        shown_links = [link for link in summary.links
+                       if not is_metaclass_name(summary.class_name(link[0]))
+                       and not is_metaclass_name(summary.class_name(link[2]))]
+        kept = set(sorted(shown_links, key=lambda link: summary.links[link].triples, reverse=True)[:max_edges])
+        summary.links = {link: stats for link, stats in summary.links.items() if link in kept}
+    return summary
        
 
 
-def gen_dot_view():
+def profile_classes(summary: SchemaSummary):
+    """ add to the profile of each class its numbers of instances, attributes and link triples """
+    link_triples = {}
+    for (x, p, z), stats in summary.links.items():
+        link_triples[x] = link_triples.get(x, 0) + stats.triples
+        if z != x: link_triples[z] = link_triples.get(z, 0) + stats.triples
+    for c in summary.classes:
+        cs = summary.class_summary(c)
+        profiler.annotate('classes', c, instances=cs.nb_instances, attributes=len(cs.attributes),
+                          link_triples=link_triples.get(c, 0))
 
-    global service 
 
-    if sys.argv[1].startswith('http://'):
-        service = f'SERVICE <{sys.argv[1]}> '
-    else:
-        g.parse(sys.argv[1])
+def gen_dot_view():
+
+    args = [a for a in sys.argv[1:] if not a.startswith('--')]
+    stream_flag = '--stream' in sys.argv
+    card_flag = '--card' in sys.argv
+    penwidth_flag = '--penwidth' in sys.argv
+    jobs = 4
+    timeout = None
+    sample = 0
+    sample_blocks = 100
+    page_size = 0
+    retries = 0
+    try:
+        formats, output = output_options(sys.argv)
+        # the prefixed names of --label-props are read with the prefixes known to rdflib
+        label_props[:] = label_properties(Graph(), label_properties_option(sys.argv))
+    except ValueError as e:
+        print(f'// ERROR // {e}', file=sys.stderr)
+        sys.exit(1)
+    profile_option(sys.argv)
+    languages = language_option(sys.argv, default='')
+    charsets_flag = '--charsets' in sys.argv
+    collapse_flag = '--collapse' in sys.argv
+    clusters_flag = '--clusters' in sys.argv
+    top = 0
+    max_nodes = 0
+    max_edges = 0
+    index_flag = '--index' in sys.argv
+    min_support = 10
+    state_file = None
+    added = []
+    removed = []
+    for arg in sys.argv:
+        if arg.startswith('--jobs='):
+            jobs = int(arg[len('--jobs='):])
+        elif arg.startswith('--timeout='):
+            timeout = float(arg[len('--timeout='):])
+        elif arg.startswith('--sample='):
+            sample = int(arg[len('--sample='):])
+        elif arg.startswith('--sample-blocks='):
+            sample_blocks = int(arg[len('--sample-blocks='):])
+        elif arg.startswith('--page-size='):
+            page_size = int(arg[len('--page-size='):])
+        elif arg.startswith('--retries='):
+            retries = int(arg[len('--retries='):])
+        elif arg.startswith('--top='):
+            top = int(arg[len('--top='):])
+        elif arg.startswith('--max-nodes='):
+            max_nodes = int(arg[len('--max-nodes='):])
+        elif arg.startswith('--max-edges='):
+            max_edges = int(arg[len('--max-edges='):])
+        elif arg.startswith('--min-support='):
+            min_support = int(arg[len('--min-support='):])
+        elif arg.startswith('--state='):
+            state_file = arg[len('--state='):]
+        elif arg.startswith('--add='):
+            added.append(arg[len('--add='):])
+        elif arg.startswith('--remove='):
+            removed.append(arg[len('--remove='):])
 
     # load additional prefixes
 
-    if len(sys.argv) > 2:
-        f = open(sys.argv[2])
+    if (len(args) > 1 or state_file and args) and args[-1].endswith('.json'):
+        f = open(args.pop())
         content = f.read()
         prefixes = json.loads(content)
         for p in prefixes:
-            invprefixes[prefixes[p]] = p
+            add_prefix(prefixes[p], p)
+
+    sources = args
+    with profiler.phase('summarize'):
+        if charsets_flag:
+            summary = summarize_charsets(sources, min_support)
+            sources = sources[:1]
+        elif state_file:
+            summary = update_state(state_file, sources, removed, added).summary()
+            sources = sources[:1]
+        elif len(sources) == 1:
+            try:
+                summary = in_thread(summarize_source, sources[0], stream_flag, timeout, sample, sample_blocks,
+                                    jobs, page_size, retries, index_flag).result(timeout)
+            except TimeoutError:
+                print(f'// ERROR // {sources[0]}: not summarized within {timeout}s', file=sys.stderr)
+                sys.exit(1)
+            except ValueError as e:
+                print(f'// ERROR // {sources[0]}: {e}', file=sys.stderr)
+                sys.exit(1)
+        else:
+            summary = summarize_sources(sources, stream_flag, jobs, timeout, sample, sample_blocks,
+                                        page_size, retries, index_flag)
+    if profiler.enabled:
+        profile_classes(summary)
+
+    if collapse_flag or top or max_nodes or max_edges:
+        with profiler.phase('level of detail'):
+            summary = level_of_detail(summary, collapse_flag, top, max_nodes, max_edges)
 
     # Find the classes, excluding the metaclasses 
     # and create a dictionary prefixed-class -> URI
 
-    qc =  f"""
-                SELECT DISTINCT ?c
-                WHERE {{
-                    {service}
-                    {{ ?x rdf:type ?c.  FILTER(! ISBLANK(?c) )
-                    }}
-                }}
-                """
-    qcres = g.query(qc) 
     classes = {}
-    for r in qcres:
-        c = prefixize(r.c)
+    for uri in summary.classes:
+        c = summary.class_name(uri)
         if not is_metaclass_name(c):
-            classes[c] = r.c
-
-    print("""
-    digraph g {
-        node [shape = record, fontname = "Helvetica"] ;
-    """)
-
-    # Find the class links
-
-    print('\n### Class link\n')
-
-    qref =  f"""
-                SELECT DISTINCT ?x ?p ?z
-                WHERE {{
-                    {service}
-                    {{ ?s rdf:type ?x. ?o rdf:type ?z . ?s ?p ?o.  FILTER(! ISBLANK(?z) )
-                }}
-                }}
-                """
-    qrefres = g.query(qref) 
-
-    clsloop = {}
-    for r in qrefres:
-        n1 = prefixize(r.x)
-        n2 = prefixize(r.z)
-        lab = prefixize(r.p)
-        if not is_metaclass_name(n1) and not is_metaclass_name(n2):
-            if n1 == n2 :
-                clsloop[n1] = clsloop[n1] + '\n' + lab if n1 in clsloop else lab
-            else:
-                print(f'  "{n1}" -> "{n2}" [label = "{lab}"] ;')
+            classes[c] = uri
 
-    for c in clsloop:
-        print(f'  "{c}" -> "{c}" [label = "{clsloop[c]}"] ;')
+    with profiler.phase('view'):
+        view = GraphView(node_attrs={'shape': 'record', 'fontname': 'Helvetica'})
 
+        # Find the class links
 
-    print('\n### Class attributes, instances, instance prefixes\n')
-    # Class attributes
+        view.comment('Class link')
 
-    for c in classes:
+        def link_cardinality(link, stats):
+            cs = summary.class_summaries.get(link[0])
+            nb_sources = stats.subjects if cs is None else (cs.sample or cs.nb_instances)
+            return stats.cardinality(nb_sources)
 
-        name = c
-        l = get_one_label(classes[c])
-        if l != '':
-            name = name +"\\n"+l
+        clsloop = {}
+        edges = []
+        for (x, p, z), stats in summary.links.items():
+            n1 = summary.class_name(x)
+            n2 = summary.class_name(z)
+            lab = prefixize(p)
+            if not is_metaclass_name(n1) and not is_metaclass_name(n2):
+                if n1 == n2 :
+                    if card_flag: lab += ' ' + link_cardinality((x, p, z), stats)
+                    clsloop.setdefault(n1, []).append(lab)
+                else:
+                    edges.append((n1, n2, lab, (x, p, z), stats))
 
-        qref =  f"""
-                    SELECT DISTINCT ?x ?p 
-                    WHERE {{ 
-                        {service}
-                        {{ ?s rdf:type <{classes[c]}>. ?s ?p ?o.  FILTER(ISLITERAL(?o) ) }}
-                    }}
-                    """
-        qrefres = g.query(qref)
+        max_triples = max((e[4].triples for e in edges), default=0)
+        for (n1, n2, lab, link, stats) in edges:
+            attrs = {}
+            if card_flag:
+                attrs['headlabel'] = link_cardinality(link, stats)
+            if penwidth_flag and max_triples > 1:
+                attrs['penwidth'] = f'{1 + 4 * math.log(1 + stats.triples) / math.log(1 + max_triples):.2f}'
+            view.edge(n1, n2, lab, attrs=attrs)
 
-        attributes = ""
-        for r in qrefres:
-            attributes += (prefixize(r.p)) + "\\l"
+        for c in clsloop:
+            view.edge(c, c, chr(10).join(clsloop[c]))
 
-        nb_inst = nb_instances(classes[c])
-        instance_pfx = find_instance_prefixes(classes[c])
 
-        print(f'"{c}" [label="{{{name} |{attributes}|{nb_inst}|{instance_pfx}}}"] ;')
+        view.comment('Class attributes, instances, instance prefixes')
+        # Class attributes
 
-    print("""subgraph {
-    node [color="white"]
-    """)
+        for c in classes:
 
-    prefixes = {}
-    for ip in invprefixes:
-        prefixes[invprefixes[ip]] = ip
+            cs = summary.class_summary(classes[c])
 
-    print('\n### Prefixes\n')
+            name = c
+            if cs.labels:
+                label = choose_label(cs.labels, languages) if languages else cs.labels[-1]
+                name = name + "\n" + str(label)
 
-    label = '"{Prefixes:|\\l'
-    for p in sorted(prefixes.keys()):
-        if p not in stdprefixes:
-            label += f"{p}: {prefixes[p]}\\l"
-    label += '}"'
-    print(f'prefs[label={label}];')
+            attributes = [prefixize(p) for p in cs.attributes]
 
-    print("}}")
+            nb_inst = [f'Instances: {cs.nb_instances} ']
+            if cs.error > 0:
+                nb_inst = [f'Instances: ~{cs.nb_instances} ± {round(cs.error)} ']
+            if cs.sample > 0:
+                nb_inst.append(f'Sampled: {cs.sample} ')
+            sections = [attributes, nb_inst, find_instance_prefixes(cs.instances)]
+            if len(sources) > 1:
+                sections.append(['Sources: ' + ' '.join(str(no) for no in cs.sources)])
+
+            cluster = None
+            if clusters_flag:
+                cluster = c.split(':')[0] if ':' in c else ''
+                view.cluster(cluster, cluster)
+            view.node(c, name, sections=sections, cluster=cluster,
+                      comment=' // '.join(f'INFO // {l}' for l in cs.labels))
+
+        prefixes = {}
+        for ip in invprefixes:
+            prefixes[invprefixes[ip]] = ip
+
+        view.comment('Prefixes')
+
+        lines = [f"{p}: {prefixes[p]}" for p in sorted(prefixes.keys()) if p not in stdprefixes]
+        view.node('prefs', 'Prefixes:', sections=[lines], attrs={'color': 'white'})
+
+        if len(sources) > 1:
+            lines = [f"{no}: {loc}" for no, loc in enumerate(sources, 1)]
+            view.node('srcs', 'Sources:', sections=[lines], attrs={'color': 'white'})
+
+    with profiler.phase('write'):
+        write_view(view, formats, output)
+
+    profiler.report()
 
 if __name__ == "__main__":
     gen_dot_view()
-
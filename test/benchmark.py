@@ -0,0 +1,327 @@
+""" Benchmarks of owl2dot and rdf-viz on the test files and on synthetic scale-ups of them
+
+% python3 benchmark.py [options]
+
+Each case runs one of the tools in a child process and records
+
+    time     wall time (s)
+    rss      peak resident set size (MB)
+    queries  number of SPARQL queries evaluated by rdflib (Graph.query)
+    output   size of the output (bytes)
+
+and, per phase, the time spent parsing (Graph.parse), querying (Graph.query) and in the
+rest of the run (building the view, writing it).
+
+The scale-ups are generated once in the data directory: the triples of a test file are
+copied n times with renamed IRIs. Ontologies (owl2dot) are copied with all their IRIs
+renamed (n disjoint copies of the ontology), instance graphs (rdf-viz) with their
+instances renamed only (n times more instances of the same classes).
+
+The cases that load the whole graph in memory are only run up to scale 100 (the 1000x
+graphs take several GB in rdflib), the streamed ones at all the scales.
+
+The endpoint cases run rdf-viz on a test file served by sparql-endpoint.py, started
+(and its file parsed) before the run: their RSS is the one of the client only, e.g.
+that of the paged queries (--page-size).
+
+The results are compared with a stored baseline: a case whose time or peak RSS grows by
+more than the tolerance (and by more than 0.5 s or 5 MB), or whose number of queries
+grows, is reported as a regression (and the exit status is 1).
+
+OPTIONS:
+
+    --scales=n1,n2...  scale-up factors (default: 10,100,1000)
+
+    --tools=owl2dot,rdf-viz  tools to benchmark (default: both)
+
+    --match=text  run only the cases whose name contains text
+
+    --repeat=n    runs per case, the fastest is kept (default: 1)
+
+    --timeout=s   time limit of a run (default: 600), a run that exceeds it is recorded as a timeout
+
+    --baseline=file  baseline file (default: benchmark-baseline.json next to this script)
+
+    --save        save the results as the new baseline (the cases of the baseline that
+                  were not run are kept)
+
+    --tolerance=x  allowed relative growth of time and RSS (default: 0.25)
+
+    --data=dir    directory of the generated scale-ups (default: kg-viz-bench in the temp directory)
+
+    --no-limit    run the in-memory cases at all the scales too
+"""
+
+from rdflib import Graph, URIRef, BNode, RDF
+from rdflib.plugins.serializers.nt import _nt_row
+
+import contextlib
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SRC = os.path.join(os.path.dirname(HERE), 'src')
+PREFIXES = os.path.join(HERE, 'prefixes.json')
+
+W3C = 'http://www.w3.org/'
+
+# smaller growths are taken as noise, whatever the tolerance
+MIN_TIME_GROWTH = 0.5   # s
+MIN_RSS_GROWTH = 5      # MB
+
+# name, tool, test file, options; the scaled cases are named name@n
+CASES = [
+    ('owl2dot-cidoc-crm', 'owl2dot', 'cidoc-crm.ttl', []),
+    ('owl2dot-cidoc-crm-annot', 'owl2dot', 'cidoc-crm.ttl', ['--annot']),
+    ('owl2dot-LIS-14', 'owl2dot', 'LIS-14.ttl', []),
+    ('owl2dot-rc', 'owl2dot', 'rc.ttl', []),
+    ('owl2dot-grc', 'owl2dot', 'grc.ttl', []),
+    ('rdf-viz-geonames', 'rdf-viz', 'geonames-test.ttl', [PREFIXES]),
+    ('rdf-viz-geonames-card', 'rdf-viz', 'geonames-test.ttl', [PREFIXES, '--card']),
+    ('rdf-viz-rc', 'rdf-viz', 'rc.ttl', [PREFIXES]),
+    ('rdf-viz-grc', 'rdf-viz', 'grc.ttl', [PREFIXES]),
+]
+
+# name, test file, options: rdf-viz on the test file served by sparql-endpoint.py
+ENDPOINT_CASES = [
+    ('rdf-viz-rc-endpoint-paged', 'rc.ttl', [PREFIXES, '--page-size=10']),
+]
+
+# name, tool, test file, options, largest scale (None: no limit)
+SCALED_CASES = [
+    ('owl2dot-cidoc-crm', 'owl2dot', 'cidoc-crm.ttl', [], 100),
+    ('rdf-viz-geonames', 'rdf-viz', 'geonames-test.ttl', [PREFIXES], 100),
+    ('rdf-viz-geonames-stream', 'rdf-viz', 'geonames-test.ttl', [PREFIXES, '--stream'], None),
+]
+
+# run in the child process: counts and times the rdflib parses and queries of the tool,
+# then writes its measures in the file named by BENCH_STATS
+PROBE = r'''
+import atexit, json, os, resource, runpy, sys, time
+from rdflib import Graph
+stats = {'queries': 0, 'parse': 0.0, 'query': 0.0}
+def timed(name, counter=None):
+    method = getattr(Graph, name)
+    def wrapper(*args, **kwargs):
+        t = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            stats[name] += time.perf_counter() - t
+            if counter: stats[counter] += 1
+    setattr(Graph, name, wrapper)
+timed('parse')
+timed('query', 'queries')
+def report():
+    rss = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+              resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    stats['rss'] = rss / 1024
+    with open(os.environ['BENCH_STATS'], 'w') as f:
+        json.dump(stats, f)
+atexit.register(report)
+script = sys.argv[1]
+sys.argv = sys.argv[1:]
+sys.path.insert(0, os.path.dirname(script))
+runpy.run_path(script, run_name='__main__')
+'''
+
+
+def renamer(copy: int, keep):
+    """ the function that renames the terms of the copy number copy (0 keeps the names) """
+    bnodes = {}
+    def rename(t):
+        if copy == 0 or keep(t):
+            return t
+        if isinstance(t, URIRef):
+            return URIRef(f'{t}_{copy}')
+        if isinstance(t, BNode):
+            if t not in bnodes: bnodes[t] = BNode()
+            return bnodes[t]
+        return t
+    return rename
+
+
+def scale_up(source: str, factor: int, instances_only: bool, path: str):
+    """ write in path (N-Triples) factor renamed copies of the triples of source """
+    g = Graph()
+    g.parse(source)
+    if instances_only:
+        fixed = set(g.predicates()) | set(g.objects(None, RDF.type))
+        keep = lambda t: t in fixed or isinstance(t, URIRef) and t.startswith(W3C)
+    else:
+        keep = lambda t: isinstance(t, URIRef) and t.startswith(W3C)
+    triples = sorted(g, key=lambda t: t[0])     # grouped by subject, for rdf-viz --stream
+    tmp = path + '.part'
+    with open(tmp, 'w', encoding='utf-8') as out:
+        for copy in range(factor):
+            rename = renamer(copy, keep)
+            # the triples that are not renamed (e.g. the class labels) are written once
+            out.write(''.join(_nt_row((rename(s), p, rename(o))) for s, p, o in triples
+                              if copy == 0 or (rename(s), rename(o)) != (s, o)))
+    os.replace(tmp, path)
+
+
+def scaled_file(data_dir: str, test_file: str, factor: int, instances_only: bool) -> str:
+    kind = 'instances' if instances_only else 'ontology'
+    path = os.path.join(data_dir, f'{os.path.splitext(test_file)[0]}-{kind}-x{factor}.nt')
+    if not os.path.exists(path):
+        os.makedirs(data_dir, exist_ok=True)
+        print(f'generating {path}', file=sys.stderr)
+        scale_up(os.path.join(HERE, test_file), factor, instances_only, path)
+    return path
+
+
+@contextlib.contextmanager
+def endpoint(graph_file: str):
+    """ the URL of sparql-endpoint.py serving graph_file, once it accepts connections """
+    with socket.socket() as s:
+        s.bind(('localhost', 0))
+        port = s.getsockname()[1]
+    server = subprocess.Popen([sys.executable, os.path.join(HERE, 'sparql-endpoint.py'), graph_file, str(port)],
+                              stderr=subprocess.DEVNULL)
+    try:
+        while server.poll() is None:
+            with contextlib.suppress(OSError), socket.create_connection(('localhost', port)):
+                break
+            time.sleep(0.1)
+        yield f'http://localhost:{port}/sparql'
+    finally:
+        server.kill()
+        server.wait()
+
+
+def run_case(tool: str, graph_file: str, options: list, timeout: float) -> dict:
+    """ the measures of one run of tool on graph_file """
+    script = os.path.join(SRC, tool + '.py')
+    with tempfile.TemporaryDirectory() as tmp:
+        stats_file = os.path.join(tmp, 'stats.json')
+        out_file = os.path.join(tmp, 'out')
+        env = dict(os.environ, BENCH_STATS=stats_file)
+        start = time.perf_counter()
+        try:
+            with open(out_file, 'wb') as out:
+                proc = subprocess.run([sys.executable, '-c', PROBE, script, graph_file] + options,
+                                      stdout=out, stderr=subprocess.DEVNULL, env=env, timeout=timeout)
+        except subprocess.TimeoutExpired:
+            return {'status': 'timeout', 'time': timeout}
+        elapsed = time.perf_counter() - start
+        if proc.returncode != 0 or not os.path.exists(stats_file):
+            return {'status': f'exit {proc.returncode}', 'time': elapsed}
+        with open(stats_file) as f:
+            stats = json.load(f)
+        return {'status': 'ok',
+                'time': round(elapsed, 3),
+                'rss': round(stats['rss'], 1),
+                'queries': stats['queries'],
+                'output': os.path.getsize(out_file),
+                'phases': {'parse': round(stats['parse'], 3),
+                           'query': round(stats['query'], 3),
+                           'other': round(max(elapsed - stats['parse'] - stats['query'], 0), 3)}}
+
+
+def cases(scales: list, limit: bool):
+    """ (name, tool, graph file, options, served) of the cases; the graph file of a scaled
+    case is (test file, scale, instances only), generated when the case is run; the graph
+    file of a served case is read by the tool from an endpoint
+    """
+    for name, tool, test_file, options in CASES:
+        yield name, tool, os.path.join(HERE, test_file), options, False
+    for name, test_file, options in ENDPOINT_CASES:
+        yield name, 'rdf-viz', os.path.join(HERE, test_file), options, True
+    for factor in scales:
+        for name, tool, test_file, options, max_scale in SCALED_CASES:
+            if limit and max_scale is not None and factor > max_scale:
+                continue
+            yield f'{name}@{factor}', tool, (test_file, factor, tool == 'rdf-viz'), options, False
+
+
+def compare(result: dict, base: dict, tolerance: float) -> list:
+    """ the regressions of result with respect to base """
+    if base.get('status') != 'ok':
+        return []
+    if result['status'] != 'ok':
+        return [result['status']]
+    problems = []
+    for measure, slack in (('time', MIN_TIME_GROWTH), ('rss', MIN_RSS_GROWTH)):
+        if result[measure] > max(base[measure] * (1 + tolerance), base[measure] + slack):
+            problems.append(f'{measure} {base[measure]} -> {result[measure]}')
+    if result['queries'] > base['queries']:
+        problems.append(f'queries {base["queries"]} -> {result["queries"]}')
+    return problems
+
+
+def main(argv: list) -> int:
+    scales = [10, 100, 1000]
+    tools = ['owl2dot', 'rdf-viz']
+    match = ''
+    repeat = 1
+    timeout = 600.0
+    baseline_file = os.path.join(HERE, 'benchmark-baseline.json')
+    save = False
+    tolerance = 0.25
+    data_dir = os.path.join(tempfile.gettempdir(), 'kg-viz-bench')
+    limit = True
+    for arg in argv[1:]:
+        if arg.startswith('--scales='):
+            scales = [int(x) for x in arg[len('--scales='):].split(',') if x]
+        elif arg.startswith('--tools='):
+            tools = arg[len('--tools='):].split(',')
+        elif arg.startswith('--match='):
+            match = arg[len('--match='):]
+        elif arg.startswith('--repeat='):
+            repeat = int(arg[len('--repeat='):])
+        elif arg.startswith('--timeout='):
+            timeout = float(arg[len('--timeout='):])
+        elif arg.startswith('--baseline='):
+            baseline_file = arg[len('--baseline='):]
+        elif arg == '--save':
+            save = True
+        elif arg.startswith('--tolerance='):
+            tolerance = float(arg[len('--tolerance='):])
+        elif arg.startswith('--data='):
+            data_dir = arg[len('--data='):]
+        elif arg == '--no-limit':
+            limit = False
+
+    baseline = {}
+    if os.path.exists(baseline_file):
+        with open(baseline_file) as f:
+            baseline = json.load(f)
+
+    results = {}
+    regressions = 0
+    print(f'{"case":40} {"time s":>8} {"RSS MB":>8} {"queries":>8} {"output":>10}  baseline')
+    for name, tool, graph_file, options, served in cases(scales, limit):
+        if tool not in tools or match not in name:
+            continue
+        if isinstance(graph_file, tuple):
+            graph_file = scaled_file(data_dir, *graph_file)
+        with endpoint(graph_file) if served else contextlib.nullcontext(graph_file) as location:
+            runs = [run_case(tool, location, options, timeout) for _ in range(repeat)]
+        result = min(runs, key=lambda r: (r['status'] != 'ok', r['time']))
+        results[name] = result
+        problems = compare(result, baseline[name], tolerance) if name in baseline else []
+        regressions += len(problems) > 0
+        verdict = 'REGRESSION: ' + ', '.join(problems) if problems else ('ok' if name in baseline else '-')
+        if result['status'] == 'ok':
+            print(f'{name:40} {result["time"]:8.2f} {result["rss"]:8.1f} {result["queries"]:8} {result["output"]:10}  {verdict}')
+        else:
+            print(f'{name:40} {result["status"]:>8} {"":8} {"":8} {"":10}  {verdict}')
+        sys.stdout.flush()
+
+    if save:
+        baseline.update(results)
+        with open(baseline_file, 'w') as f:
+            json.dump(baseline, f, indent=1, sort_keys=True)
+            f.write('\n')
+        print(f'baseline saved in {baseline_file}')
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,60 @@
+""" A minimal local SPARQL endpoint that serves an RDF file, to try the endpoint
+mode of rdf-viz without a triple store
+
+% python3 sparql-endpoint.py graph-file [port]
+
+then
+
+% python3 ../src/rdf-viz.py http://localhost:port/sparql prefixes.json
+
+Queries are accepted with GET (query=...) or POST (form or application/sparql-query)
+and answered in the SPARQL XML or JSON results format.
+"""
+
+from rdflib import Graph
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+import sys
+
+g = Graph()
+
+
+class SPARQLHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        params = parse_qs(urlparse(self.path).query)
+        self.answer(params.get('query', [''])[0])
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0))).decode('utf-8')
+        if self.headers.get('Content-Type', '').startswith('application/sparql-query'):
+            self.answer(body)
+        else:
+            self.answer(parse_qs(body).get('query', [''])[0])
+
+    def answer(self, query: str):
+        try:
+            res = g.query(query)
+        except Exception as e:
+            self.send_error(400, str(e))
+            return
+        if 'json' in self.headers.get('Accept', ''):
+            fmt, content_type = 'json', 'application/sparql-results+json'
+        else:
+            fmt, content_type = 'xml', 'application/sparql-results+xml'
+        data = res.serialize(format=fmt)
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        sys.stderr.write('// ' + (format % args) + '\n')
+
+
+if __name__ == "__main__":
+    g.parse(sys.argv[1])
+    port = int(sys.argv[2]) if len(sys.argv) > 2 else 7200
+    ThreadingHTTPServer(('localhost', port), SPARQLHandler).serve_forever()
@@ -0,0 +1,46 @@
+""" Tests of the owl:imports closure (owl2dot --imports)
+
+% python3 -m pytest test
+"""
+
+import os
+import sys
+import uuid
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(HERE), 'src'))
+
+from concurrent.futures import ThreadPoolExecutor
+
+import imports
+from imports import ImportsClosure
+
+
+class CountingExecutor(ThreadPoolExecutor):
+    """ counts the documents submitted for parsing """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.submitted = []
+
+    def submit(self, fn, *args, **kwargs):
+        self.submitted.append(args[0])
+        return super().submit(fn, *args, **kwargs)
+
+
+def test_same_document_under_two_iris_is_parsed_once(tmp_path, monkeypatch):
+    # a content seen by no other test, the parsed documents are kept by the process
+    module = f'<http://example.org/{uuid.uuid4()}> a <http://www.w3.org/2002/07/owl#Ontology> .\n'
+    (tmp_path / 'a.ttl').write_text(module)
+    (tmp_path / 'b.ttl').write_text(module)
+    (tmp_path / 'main.ttl').write_text(
+        '@prefix owl: <http://www.w3.org/2002/07/owl#> .\n'
+        '<http://example.org/main> a owl:Ontology ;\n'
+        '    owl:imports <http://example.org/a>, <http://example.org/b> .\n')
+    executors = []
+    monkeypatch.setattr(imports, 'ProcessPoolExecutor',
+                        lambda max_workers: executors.append(CountingExecutor(max_workers)) or executors[-1])
+    closure = ImportsClosure(str(tmp_path / 'main.ttl'))
+    assert len(executors[0].submitted) == 1
+    assert len(closure.modules) == 2
+    assert not closure.missing
@@ -0,0 +1,79 @@
+""" Tests of owl2dot on the test ontologies
+
+% python3 -m pytest test
+"""
+
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(HERE), 'src'))
+
+from rdflib import Graph, Literal, Namespace, URIRef
+from rdflib.namespace import RDFS
+
+from owl2dot import OntologyView, ViewOptions
+
+
+def edges(view) -> list:
+    """ the edges of the view, with what tells their kind (subclass, restriction...) """
+    return [(e.source, e.target, e.label, e.attrs.get('arrowhead')) for e in view.edges()]
+
+
+def test_upper_draws_each_edge_once():
+    ontology = OntologyView(os.path.join(HERE, 'cidoc-crm.ttl'))
+    plain = edges(ontology.render(ViewOptions()))
+    upper = edges(ontology.render(ViewOptions(upper=True)))
+    assert len(set(plain)) == len(plain)
+    assert len(set(upper)) == len(upper)
+    # all the subclass edges are already drawn in the whole ontology
+    assert set(upper) == set(plain)
+
+
+def test_focus_upper_reaches_the_top_classes():
+    ontology = OntologyView(os.path.join(HERE, 'cidoc-crm.ttl'))
+    view = ontology.render(ViewOptions(focus=['E21_Person'], depth=1, upper=True))
+    drawn = edges(view)
+    assert len(set(drawn)) == len(drawn)
+    crm = 'http://www.cidoc-crm.org/cidoc-crm/'
+    assert (crm + 'E77_Persistent_Item', crm + 'E1_CRM_Entity', '', 'onormal') in drawn
+
+
+def test_focus_by_label_uses_the_label_properties():
+    ontology = OntologyView(os.path.join(HERE, 'cidoc-crm.ttl'))
+    slice = ontology.focus(['Person'], 0, [str(RDFS.label)])
+    assert URIRef('http://www.cidoc-crm.org/cidoc-crm/E21_Person') in set(slice.g.subjects())
+
+
+def test_annotations_of_the_upper_classes():
+    ontology = OntologyView(os.path.join(HERE, 'cidoc-crm.ttl'))
+    view = ontology.render(ViewOptions(focus=['E21_Person'], depth=1, upper=True, annot=True))
+    entity = 'http://www.cidoc-crm.org/cidoc-crm/E1_CRM_Entity'
+    assert any(source == entity and target.startswith(entity + '-') for source, target, _, _ in edges(view))
+
+
+VIEWS = [ViewOptions(), ViewOptions(annot=True), ViewOptions(focus=['E21_Person'], depth=1)]
+
+
+def drawn(view) -> tuple:
+    """ the nodes (with their title) and the edges of the view, whatever their order """
+    return {(n.id, n.title) for n in view.nodes.values()}, set(edges(view))
+
+
+def test_reload_as_a_fresh_parse(tmp_path):
+    crm = Namespace('http://www.cidoc-crm.org/cidoc-crm/')
+    path = str(tmp_path / 'crm.ttl')
+    g = Graph().parse(os.path.join(HERE, 'cidoc-crm.ttl'))
+    g.serialize(path, format='turtle')
+    ontology = OntologyView(path)
+    before = [drawn(ontology.render(options)) for options in VIEWS]     # and the caches that reload() updates
+    g.remove((crm.E21_Person, RDFS.subClassOf, None))
+    g.add((crm.E21_Person, RDFS.subClassOf, crm.E77_Persistent_Item))
+    g.remove((crm.E5_Event, None, None))
+    g.add((crm.E99_Product_Type, RDFS.label, Literal('Product Type', lang='en')))
+    g.serialize(path, format='turtle')
+    assert ontology.reload()
+    fresh = OntologyView(path)
+    after = [drawn(ontology.render(options)) for options in VIEWS]
+    assert after == [drawn(fresh.render(options)) for options in VIEWS]
+    assert all(b != a for b, a in zip(before, after))
@@ -0,0 +1,214 @@
+""" Tests of rdf-viz on the test graphs
+
+% python3 -m pytest test
+"""
+
+import contextlib
+import importlib.util
+import io
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SRC = os.path.join(os.path.dirname(HERE), 'src')
+sys.path.insert(0, SRC)
+
+import pytest
+
+from graphview import GraphView, write_dot
+
+spec = importlib.util.spec_from_file_location('rdf_viz', os.path.join(SRC, 'rdf-viz.py'))
+rdf_viz = importlib.util.module_from_spec(spec)
+sys.modules['rdf_viz'] = rdf_viz      # for the pickled functions and states
+spec.loader.exec_module(rdf_viz)
+
+
+def summary(path: str):
+    return rdf_viz.summarize_sources([os.path.join(HERE, path)])
+
+
+@contextlib.contextmanager
+def endpoint(path: str):
+    """ the URL of test/sparql-endpoint.py serving the graph file path """
+    with socket.socket() as s:
+        s.bind(('localhost', 0))
+        port = s.getsockname()[1]
+    server = subprocess.Popen([sys.executable, os.path.join(HERE, 'sparql-endpoint.py'), str(path), str(port)],
+                              stderr=subprocess.DEVNULL)
+    try:
+        for _ in range(100):
+            with contextlib.suppress(OSError), socket.create_connection(('localhost', port)):
+                break
+            time.sleep(0.1)
+        yield f'http://localhost:{port}/sparql'
+    finally:
+        server.kill()
+        server.wait()
+
+
+def test_single_class_is_not_folded_into_a_group():
+    s = summary('geonames-test.ttl')
+    shown = [c for c in s.classes if not rdf_viz.is_metaclass_name(s.class_name(c))]
+    grouped = rdf_viz.level_of_detail(s, top=len(shown) - 1)
+    assert all(label != '1 classes' for c in grouped.classes for label in grouped.class_summary(c).labels)
+    assert set(grouped.classes) == set(s.classes)
+
+
+def test_comments_of_clustered_nodes_are_in_their_cluster():
+    view = GraphView()
+    view.node('a', 'A', cluster='p0', comment='INFO a')
+    view.edge('a', 'b')
+    view.node('b', 'B', comment='INFO b')
+    out = io.StringIO()
+    write_dot(view, out)
+    lines = out.getvalue().splitlines()
+    cluster = lines.index('  subgraph cluster_0 {')
+    assert lines.index('    // INFO a') == cluster + 2
+    assert lines[cluster + 3].startswith('    "a"')
+
+
+def test_slow_source_is_left_out_after_the_timeout(monkeypatch, capsys):
+    summarize_source = rdf_viz.summarize_source
+    def slow(location, *args):
+        if location == 'slow':
+            time.sleep(30)
+        return summarize_source(location, *args)
+    monkeypatch.setattr(rdf_viz, 'summarize_source', slow)
+    start = time.monotonic()
+    s = rdf_viz.summarize_sources(['slow', os.path.join(HERE, 'geonames-test.ttl')], timeout=3)
+    assert time.monotonic() - start < 10
+    assert s.classes
+    assert 'slow: not summarized within 3s' in capsys.readouterr().err
+
+
+
+def test_source_left_out_keeps_its_job_until_it_ends(monkeypatch):
+    lock = threading.Lock()
+    running, most = 0, 0
+    def slow(location, *args):
+        nonlocal running, most
+        with lock:
+            running += 1
+            most = max(most, running)
+        time.sleep(1)
+        with lock:
+            running -= 1
+        return rdf_viz.SchemaSummary([], {}, {})
+    monkeypatch.setattr(rdf_viz, 'summarize_source', slow)
+    rdf_viz.summarize_sources(['a', 'b', 'c'], jobs=1, timeout=0.2)
+    assert most == 1
+
+def test_class_labels_from_the_label_properties(tmp_path, monkeypatch):
+    path = tmp_path / 'labels.ttl'
+    path.write_text('@prefix ex: <http://example.org/> .\n'
+                    '@prefix skos: <http://www.w3.org/2004/02/skos/core#> .\n'
+                    '@prefix dct: <http://purl.org/dc/terms/> .\n'
+                    'ex:A skos:prefLabel "Alpha" .\n'
+                    'ex:B dct:title "Beta" .\n'
+                    'ex:a a ex:A . ex:b a ex:B .\n')
+    monkeypatch.setattr(rdf_viz, 'label_props', rdf_viz.label_properties(rdf_viz.Graph(), ['dcterms:title']))
+    s = rdf_viz.summarize_source(str(path))
+    assert [str(s.class_summary(c).labels[0]) for c in s.classes] == ['Alpha', 'Beta']
+
+
+def test_stream_reports_a_subject_that_is_not_grouped(tmp_path, monkeypatch):
+    monkeypatch.setattr(rdf_viz.StreamingSummarizer, 'BATCH_SIZE', 3)
+    lines = [f'<http://example.org/r{i}> <http://www.w3.org/1999/02/22-rdf-syntax-ns#type> <http://example.org/C> .'
+             for i in range(5)]
+    path = tmp_path / 'grouped.nt'
+    path.write_text('\n'.join(lines) + '\n')
+    assert rdf_viz.summarize_stream(str(path)).class_summary(rdf_viz.URIRef('http://example.org/C')).nb_instances == 5
+    path = tmp_path / 'ungrouped.nt'
+    path.write_text('\n'.join(lines + [lines[4].replace('r4', 'r1')]) + '\n')
+    with pytest.raises(ValueError, match='r1> are not grouped'):
+        rdf_viz.summarize_stream(str(path))
+
+
+TWO_LANGUAGES = ('<http://example.org/A> <http://www.w3.org/2000/01/rdf-schema#label> "Alpha"@en .\n'
+                 '<http://example.org/A> <http://www.w3.org/2000/01/rdf-schema#label> "Alph\\u00E9"@fr .\n'
+                 '<http://example.org/a> <http://www.w3.org/1999/02/22-rdf-syntax-ns#type> <http://example.org/A> .\n')
+
+
+@pytest.mark.parametrize('mode', ['file', 'stream', 'index', 'shards', 'state', 'sample',
+                                  'endpoint', 'endpoint-paged', 'endpoint-sample'])
+def test_labels_in_two_languages(tmp_path, mode):
+    path = tmp_path / 'labels.nt'
+    path.write_text(TWO_LANGUAGES)
+    (tmp_path / 'shards').mkdir()
+    (tmp_path / 'shards' / 'labels.nt').write_text(TWO_LANGUAGES)
+    with endpoint(path) if mode.startswith('endpoint') else contextlib.nullcontext() as url:
+        if mode == 'state':
+            s = rdf_viz.update_state(str(tmp_path / 'state'), [str(path)], [], []).summary()
+        else:
+            s = rdf_viz.summarize_source(url or str(tmp_path / 'shards' if mode == 'shards' else path),
+                                         stream_flag=mode == 'stream', index_flag=mode == 'index',
+                                         sample=5 if mode.endswith('sample') else 0,
+                                         page_size=2 if mode == 'endpoint-paged' else 0)
+    labels = s.class_summary(rdf_viz.URIRef('http://example.org/A')).labels
+    assert str(rdf_viz.choose_label(labels, ['en'])) == 'Alpha'
+    assert str(rdf_viz.choose_label(labels, ['fr'])) == 'Alph\u00e9'
+
+
+def comparable(s) -> tuple:
+    """ the content of the summary s, whatever the order of its classes and links """
+    classes = {c: (cs.nb_instances, sorted(cs.attributes), sorted(rdf_viz.extractprefix(i) for i in cs.instances),
+                   sorted(map(str, cs.labels)))
+               for c in s.classes for cs in [s.class_summary(c)]}
+    return classes, dict(s.links)
+
+
+def test_state_remove_after_the_sources(tmp_path):
+    graph = rdf_viz.Graph().parse(os.path.join(HERE, 'geonames-test.ttl'))
+    lines = sorted(graph.serialize(format='nt').splitlines(keepends=True))
+    full, part1, part2 = (tmp_path / name for name in ('full.nt', 'part1.nt', 'part2.nt'))
+    full.write_text(''.join(lines))
+    part1.write_text(''.join(lines[:len(lines) // 2]))
+    part2.write_text(''.join(lines[len(lines) // 2:]))
+    removed = rdf_viz.update_state(str(tmp_path / 'full.state'), [str(full)], [str(part2)], [])
+    assert comparable(removed.summary()) == comparable(rdf_viz.summarize_source(str(part1)))
+    added = rdf_viz.update_state(str(tmp_path / 'full.state'), [], [], [str(part2)])
+    assert comparable(added.summary()) == comparable(rdf_viz.summarize_source(str(full)))
+
+
+def sorted_nt(tmp_path, name: str):
+    """ the bundled graph file name as sorted N-Triples in tmp_path, grouped by subject for --stream """
+    graph = rdf_viz.Graph().parse(os.path.join(HERE, name))
+    path = tmp_path / (name.rsplit('.', 1)[0] + '.nt')
+    path.write_text(''.join(sorted(graph.serialize(format='nt').splitlines(keepends=True))))
+    return path
+
+
+@pytest.mark.parametrize('name', ['geonames-test.ttl', 'rc.ttl', 'grc.ttl'])
+def test_stream_as_file_mode(tmp_path, name):
+    path = str(sorted_nt(tmp_path, name))
+    assert comparable(rdf_viz.summarize_source(path, stream_flag=True)) == comparable(rdf_viz.summarize_source(path))
+
+
+@pytest.mark.parametrize('name', ['geonames-test.ttl', 'rc.ttl', 'grc.ttl'])
+def test_index_reused_as_file_mode(tmp_path, name):
+    path = str(sorted_nt(tmp_path, name))
+    expected = comparable(rdf_viz.summarize_source(path))
+    assert comparable(rdf_viz.summarize_source(path, index_flag=True)) == expected
+    meta = os.path.join(path + '.idx', 'meta.json')
+    built = os.stat(meta).st_mtime_ns
+    assert comparable(rdf_viz.summarize_source(path, index_flag=True)) == expected
+    assert os.stat(meta).st_mtime_ns == built
+
+
+def test_state_add_after_the_sources(tmp_path):
+    full = sorted_nt(tmp_path, 'geonames-test.ttl')
+    lines = full.read_text().splitlines(keepends=True)
+    part1, part2 = tmp_path / 'part1.nt', tmp_path / 'part2.nt'
+    part1.write_text(''.join(lines[:len(lines) // 2]))
+    part2.write_text(''.join(lines[len(lines) // 2:]))
+    state = str(tmp_path / 'part1.state')
+    assert comparable(rdf_viz.update_state(state, [str(part1)], [], []).summary()) == \
+        comparable(rdf_viz.summarize_source(str(part1)))
+    added = rdf_viz.update_state(state, [], [], [str(part2)])
+    assert comparable(added.summary()) == comparable(rdf_viz.summarize_source(str(full)))
+    removed = rdf_viz.update_state(state, [], [str(part2)], [])
+    assert comparable(removed.summary()) == comparable(rdf_viz.summarize_source(str(part1)))